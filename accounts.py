@@ -0,0 +1,265 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ru_local as ru
+import import_financial_data_ru as fdi
+import catigorize as cat
+import aggregation as agg
+import planing as plan
+import forecast as fc
+import parallel
+import report_render as render
+
+
+# Position of the account in a categorized transaction
+# [date, amount, description, type, category, account].
+ACCOUNT_INDEX = 5
+
+# Number of accounts in one task of the worker pool.
+SHARD_SIZE = 256
+
+
+class PartitionedAccumulator:
+    '''
+    One ReportAccumulator per account, filled in one pass over
+    transactions of many accounts. Accounts keep the order of their
+    first appearance. With distributions=True every account also fills
+    SpendingSketches.
+    '''
+
+    def __init__(self, distributions: bool = False):
+        self.distributions = distributions
+        # {account : ReportAccumulator, ...}
+        self.accounts = {}
+
+    def add(self, transaction: list) -> None:
+        '''
+        Adds one transaction [date, amount, description, type, category, account].
+        '''
+        account = transaction[ACCOUNT_INDEX]
+        accumulator = self.accounts.get(account)
+        if accumulator is None:
+            accumulator = self.accounts[account] = parallel.new_accumulator(self.distributions)
+        accumulator.add(transaction)
+
+    def add_all(self, transactions) -> 'PartitionedAccumulator':
+        for transaction in transactions:
+            self.add(transaction)
+        return self
+
+    def merge(self, other: 'PartitionedAccumulator') -> 'PartitionedAccumulator':
+        '''
+        Adds the accounts of another part of the same data (in the order of the data).
+        '''
+        for account, accumulator in other.accounts.items():
+            if account in self.accounts:
+                self.accounts[account].merge(accumulator)
+            else:
+                self.accounts[account] = accumulator
+        return self
+
+    def portfolio(self) -> agg.ReportAccumulator:
+        '''
+        All accounts rolled up into one accumulator. Categories and months
+        are in the order of their first appearance in the accounts.
+        '''
+        result = parallel.new_accumulator(self.distributions)
+        for accumulator in self.accounts.values():
+            result.merge(accumulator)
+        return result
+
+
+def finish_reports(accumulators: list, forecast_method: str = '') -> list:
+    '''
+    Statistics and planning of many accounts. Returns for every accumulator
+    the report data (stats, category_stats, time_stats, analysis, budget)
+    or the error of its account, so one account does not stop the others:
+    [(report data or None, error or None), ...]
+
+    With a forecast_method the next month of all the accounts is forecast
+    in one call of forecast.forecast_many and their budgets are planned
+    for that month. The analysis of an accumulator with sketches gets
+    their sections, as in main.build_report.
+    '''
+    analyses = []
+    for accumulator in accumulators:
+        try:
+            analysis = plan.summarize_months_data(accumulator.months_data())
+            if accumulator.sketches is not None:
+                analysis.update(accumulator.sketches.sections())
+            analyses.append(analysis)
+        except Exception as error:
+            analyses.append(f'{type(error).__name__}: {error}')
+
+    if forecast_method:
+        planned = [analysis for analysis in analyses if isinstance(analysis, dict)]
+        forecasts = fc.forecast_many([analysis['category data by month']
+                                      for analysis in planned], forecast_method)
+        for analysis, forecast in zip(planned, forecasts):
+            analysis['forecast'] = forecast
+
+    results = []
+    for accumulator, analysis in zip(accumulators, analyses):
+        if not isinstance(analysis, dict):
+            results.append((None, analysis))
+            continue
+        try:
+            time_stats = accumulator.by_time()
+            budget = plan.compare_budget_vs_actual(
+                plan.create_budget_template(time_stats, analysis, analysis.get('forecast')))
+            results.append(((accumulator.basic_stats(), accumulator.by_category(),
+                             time_stats, analysis, budget), None))
+        except Exception as error:
+            results.append((None, f'{type(error).__name__}: {error}'))
+    return results
+
+
+def process_range(filename: str, start: int, end: int, file_format: str,
+                  header: list, distributions: bool = False) -> PartitionedAccumulator:
+    '''
+    Worker of the process pool: parses, categorizes and aggregates
+    by account the lines in bytes [start, end) of the file.
+    '''
+    transactions = parallel.iter_range(filename, start, end, file_format, header,
+                                       accounts=True)
+    return PartitionedAccumulator(distributions).add_all(
+        cat.iter_categorized_transactions(transactions))
+
+
+def partition_file(filename: str, executor: ProcessPoolExecutor = None,
+                   workers: int = 1, distributions: bool = False) -> PartitionedAccumulator:
+    '''
+    Aggregates a file by account in one pass. With an executor a CSV or
+    JSON Lines file is split into byte ranges as in parallel.parallel_report
+    and the partial results are merged in file order.
+    '''
+    if executor is None:
+        transactions = fdi.iter_financial_data(filename, accounts=True)
+        return PartitionedAccumulator(distributions).add_all(
+            cat.iter_categorized_transactions(transactions))
+
+    file_format, header = parallel.read_header(filename)
+    ranges = parallel.split_file(filename, workers * 4, skip_header=file_format == 'csv')
+    futures = [executor.submit(process_range, filename, start, end, file_format, header,
+                               distributions)
+               for start, end in ranges]
+
+    result = PartitionedAccumulator(distributions)
+    for future in futures:
+        result.merge(future.result())
+    return result
+
+
+def account_reports(filename: str, workers: int = 0, forecast_method: str = '',
+                    distributions: bool = False) -> tuple:
+    '''
+    Reports of every account of a file and of the whole portfolio.
+
+    Transactions are read and aggregated by account in one pass, then
+    statistics and planning of the accounts are computed in shards of
+    SHARD_SIZE accounts. With workers both steps run on a process pool
+    (the file must then be CSV or JSON Lines). forecast_method is passed
+    to finish_reports. With distributions=True every report gets the
+    sections of SpendingSketches.
+
+    Returns:
+        ({account : (report data or None, error or None), ...},
+         (portfolio report data or None, error or None))
+    '''
+    if not workers:
+        partitions = partition_file(filename, distributions=distributions)
+        accumulators = list(partitions.accounts.values()) + [partitions.portfolio()]
+        results = finish_reports(accumulators, forecast_method)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partitions = partition_file(filename, executor, workers, distributions)
+            accumulators = list(partitions.accounts.values()) + [partitions.portfolio()]
+            futures = [executor.submit(finish_reports, accumulators[i:i + SHARD_SIZE],
+                                       forecast_method)
+                       for i in range(0, len(accumulators), SHARD_SIZE)]
+            results = [result for future in futures for result in future.result()]
+
+    return dict(zip(partitions.accounts, results)), results[-1]
+
+
+def output_names(accounts, output_dir: str, extension: str = 'txt') -> list:
+    '''
+    Report files of the portfolio and of every account in output_dir.
+    The portfolio comes first, so an account named 'portfolio' gets a number,
+    as do accounts whose names are the same after cleaning.
+    '''
+    names = []
+    used = set()
+    for stem in ['portfolio'] + [account.replace(os.sep, '_') or 'default'
+                                 for account in accounts]:
+        name, number = f'{stem}.{extension}', 1
+        while name in used:
+            number += 1
+            name = f'{stem}_{number}.{extension}'
+        used.add(name)
+        names.append(os.path.join(output_dir, name))
+    return names
+
+
+def write_account_reports(filename: str, output_dir: str, workers: int = 0,
+                          output_format: str = 'console', forecast_method: str = '',
+                          distributions: bool = False) -> dict:
+    '''
+    Writes the report of the portfolio and of every account into output_dir
+    and returns the summary: number of accounts, failed accounts, time
+    and per-account results.
+    '''
+    started = time.perf_counter()
+    # The progress bar of the import is not needed here.
+    with contextlib.redirect_stderr(io.StringIO()):
+        reports, portfolio = account_reports(filename, workers, forecast_method,
+                                             distributions)
+
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = output_names(reports, output_dir, render.RENDERERS[output_format][1])
+
+    results = []
+    for output, (account, (report_data, error)) in zip(
+            outputs, [(None, portfolio)] + list(reports.items())):
+        result = {'account': account, 'output': output}
+        if report_data is None:
+            result.update(status='error', error=error)
+        else:
+            with open(output, mode='w', encoding='UTF-8', newline='') as file:
+                render.write_report(output_format, report_data, file)
+            result.update(status='ok',
+                          transactions=report_data[0][ru.TRANSACTIONS_QUANTITY])
+        results.append(result)
+
+    return {'accounts': len(reports),
+            'failed': sum(result['status'] != 'ok' for result in results[1:]),
+            'transactions': results[0].get('transactions', 0),
+            'seconds': round(time.perf_counter() - started, 6),
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Reports of every account of a statement file and of the portfolio.')
+    parser.add_argument('filename')
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='process a csv / jsonl file on this many processes')
+    parser.add_argument('--forecast', default='', choices=fc.METHODS,
+                        help='forecast the expenses of the next month and plan its budget')
+    parser.add_argument('--distributions', action='store_true',
+                        help='add the largest expenses and median / p95 sections')
+    parser.add_argument('--format', default='console', choices=list(render.RENDERERS),
+                        help='format of the report files')
+    args = parser.parse_args()
+
+    summary = write_account_reports(args.filename, args.output_dir, args.workers, args.format,
+                                    args.forecast, args.distributions)
+    sys.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2) + '\n')
+    sys.exit(1 if summary['failed'] else 0)
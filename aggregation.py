@@ -0,0 +1,173 @@
+import ru_local as ru
+import statistic as stat
+import planing as plan
+
+
+class ReportAccumulator:
+    '''
+    Collects everything the report needs in one pass over the transactions.
+
+    Accumulators:
+        totals - income, expenses and number of transactions
+        per category - expense sum and number of transactions
+        per month - income and expenses
+        per month per category - number of transactions and expenses
+
+    Months are periods (year, month).
+
+    Seasons are derived from the per-month expenses, so the results are
+    exactly the same as those of the functions in statistic.py and planing.py.
+
+    SpendingSketches, if given, are filled with the same transactions
+    and merged with the sketches of the other parts.
+    '''
+
+    def __init__(self, sketches=None):
+        self.sketches = sketches
+        self.total_income = 0
+        self.total_expenses = 0
+        self.quantity = 0
+        # {category : [expenses, number of transactions], ...}
+        self.category_totals = {}
+        # {(year, month) : [income, expenses], ...}
+        self.month_totals = {}
+        # {(year, month) : {category : number of transactions, ...}, ...}
+        self.month_category_counts = {}
+        # {(year, month) : {category : expenses, ...}, ...}
+        self.month_category_expenses = {}
+
+    def add(self, transaction: list) -> None:
+        '''
+        Adds one transaction [date, amount, description, type, category]
+        to all accumulators.
+        '''
+        amount = transaction[1]
+        transaction_type = transaction[3]
+        category = transaction[4]
+        month = stat.period_key(transaction[0])
+
+        self.quantity += 1
+
+        if month not in self.month_totals:
+            self.month_totals[month] = [0, 0]
+            self.month_category_counts[month] = {}
+            self.month_category_expenses[month] = {}
+
+        counts = self.month_category_counts[month]
+        counts[category] = counts.get(category, 0) + 1
+
+        if transaction_type == ru.INCOME:
+            self.total_income += amount
+            self.month_totals[month][0] += amount
+        else:
+            self.total_expenses += amount
+            self.month_totals[month][1] += amount
+
+            if category in self.category_totals:
+                self.category_totals[category][0] += amount
+                self.category_totals[category][1] += 1
+            else:
+                self.category_totals[category] = [amount, 1]
+
+        # Historical analysis counts only transactions of type "расход".
+        if transaction_type == ru.EXPENSE:
+            expenses = self.month_category_expenses[month]
+            expenses[category] = expenses.get(category, 0) + amount
+
+        if self.sketches is not None:
+            self.sketches.add(transaction)
+
+    def add_all(self, transactions) -> 'ReportAccumulator':
+        '''
+        Adds every transaction of any iterable and returns the accumulator.
+        '''
+        for transaction in transactions:
+            self.add(transaction)
+        return self
+
+    def merge(self, other: 'ReportAccumulator') -> 'ReportAccumulator':
+        '''
+        Adds the accumulators of another part of the same data.
+        Parts must be merged in the order of the data, then categories
+        and months keep the order of their first appearance.
+        '''
+        self.total_income += other.total_income
+        self.total_expenses += other.total_expenses
+        self.quantity += other.quantity
+        if self.sketches is not None and other.sketches is not None:
+            self.sketches.merge(other.sketches)
+
+        for category, (total_sum, quantity) in other.category_totals.items():
+            if category in self.category_totals:
+                self.category_totals[category][0] += total_sum
+                self.category_totals[category][1] += quantity
+            else:
+                self.category_totals[category] = [total_sum, quantity]
+
+        for month, (income, expenses) in other.month_totals.items():
+            if month not in self.month_totals:
+                self.month_totals[month] = [0, 0]
+                self.month_category_counts[month] = {}
+                self.month_category_expenses[month] = {}
+
+            self.month_totals[month][0] += income
+            self.month_totals[month][1] += expenses
+
+            counts = self.month_category_counts[month]
+            for category, quantity in other.month_category_counts[month].items():
+                counts[category] = counts.get(category, 0) + quantity
+
+            month_expenses = self.month_category_expenses[month]
+            for category, value in other.month_category_expenses[month].items():
+                month_expenses[category] = month_expenses.get(category, 0) + value
+
+        return self
+
+    def basic_stats(self) -> dict:
+        '''
+        Same result as statistic.calculate_basic_stats.
+        '''
+        return {ru.INCOME: self.total_income,
+                ru.EXPENSE: self.total_expenses,
+                ru.BALANCE: self.total_income - self.total_expenses,
+                ru.TRANSACTIONS_QUANTITY: self.quantity}
+
+    def by_category(self) -> dict:
+        '''
+        Same result as statistic.calculate_by_category.
+        '''
+        category_info = {}
+        for category, (total_sum, quantity) in self.category_totals.items():
+            percent = round(total_sum / self.total_expenses * 100, 2)
+            category_info[category] = [total_sum, quantity, percent]
+        return category_info
+
+    def by_time(self) -> dict:
+        '''
+        Same result as statistic.analyze_by_time.
+        '''
+        month_info = {}
+        for month, (income, expenses) in self.month_totals.items():
+            quantity_category = self.month_category_counts[month]
+            n = max(quantity_category.values())
+            popular_categories = [category for category in quantity_category
+                                  if quantity_category[category] == n]
+
+            month_info[month] = {ru.INCOME: income,
+                                 ru.EXPENSE: expenses,
+                                 ru.POPULAR_CATEGORIES: popular_categories}
+        return month_info
+
+    def months_data(self) -> dict:
+        '''
+        Expenses of type "расход" by month and category,
+        the input of planing.summarize_months_data.
+        '''
+        return {month: dict(expenses) for month, expenses
+                in self.month_category_expenses.items()}
+
+    def historical(self) -> dict:
+        '''
+        Same result as planing.analyze_historical_spending.
+        '''
+        return plan.summarize_months_data(self.months_data())
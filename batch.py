@@ -0,0 +1,129 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ru_local as ru
+import main
+import report_render as render
+
+
+def expand_inputs(patterns: list) -> list:
+    '''
+    Turns file names, glob patterns and list files (@list.txt, one name
+    per line) into a sorted list of unique file names.
+    '''
+    filenames = []
+    for pattern in patterns:
+        if pattern.startswith('@'):
+            with open(pattern[1:], mode='r', encoding='UTF-8') as file:
+                filenames += expand_inputs([line.strip() for line in file
+                                            if line.strip()])
+        elif any(char in pattern for char in '*?['):
+            filenames += glob.glob(pattern, recursive=True)
+        else:
+            filenames.append(pattern)
+    return sorted(set(filenames))
+
+
+def output_names(filenames: list, output_dir: str, extension: str = 'txt') -> dict:
+    '''
+    Gives every input file its own report file in output_dir.
+    Files with the same name get a number added.
+    '''
+    names = {}
+    used = set()
+    for filename in filenames:
+        stem = os.path.basename(filename)
+        name, number = f'{stem}.{extension}', 1
+        while name in used:
+            number += 1
+            name = f'{stem}_{number}.{extension}'
+        used.add(name)
+        names[filename] = os.path.join(output_dir, name)
+    return names
+
+
+def process_file(filename: str, output: str, options: dict,
+                 output_format: str = 'console') -> dict:
+    '''
+    Worker of the process pool: builds the report of one file and writes
+    it to output in one of the report_render formats. Errors are returned in the result instead of being raised,
+    so one bad file does not stop the batch.
+    '''
+    started = time.perf_counter()
+    result = {'file': filename, 'output': output}
+    try:
+        # The progress bar of the import is not needed in batch mode.
+        with contextlib.redirect_stderr(io.StringIO()):
+            report_data = main.build_report(filename, **options)
+
+        with open(output, mode='w', encoding='UTF-8', newline='') as file:
+            render.write_report(output_format, report_data, file)
+
+        result['status'] = 'ok'
+        result['transactions'] = report_data[0][ru.TRANSACTIONS_QUANTITY]
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = f'{type(error).__name__}: {error}'
+
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def run_batch(filenames: list, output_dir: str, processes: int = None,
+              options: dict = None, output_format: str = 'console') -> dict:
+    '''
+    Processes the files on a process pool and returns the summary:
+    number of processed and failed files, total time and per-file results.
+    '''
+    options = options or {}
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = output_names(filenames, output_dir, render.RENDERERS[output_format][1])
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(process_file, filename, outputs[filename], options,
+                                   output_format)
+                   for filename in filenames]
+        results = [future.result() for future in futures]
+    seconds = time.perf_counter() - started
+
+    return {'files': len(results),
+            'ok': sum(result['status'] == 'ok' for result in results),
+            'failed': sum(result['status'] != 'ok' for result in results),
+            'transactions': sum(result.get('transactions', 0) for result in results),
+            'seconds': round(seconds, 6),
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Builds reports for many statement files in parallel.')
+    parser.add_argument('inputs', nargs='+',
+                        help='files, glob patterns or @list files')
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='size of the process pool (default: number of CPUs)')
+    parser.add_argument('--stream', action='store_true',
+                        help='read every file lazily, keeping memory flat')
+    parser.add_argument('--format', default='console', choices=list(render.RENDERERS),
+                        help='format of the report files')
+    parser.add_argument('--summary', default=None,
+                        help='also write the JSON summary to this file')
+    args = parser.parse_args()
+
+    summary = run_batch(expand_inputs(args.inputs), args.output_dir,
+                        args.processes, {'stream': args.stream}, args.format)
+
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, mode='w', encoding='UTF-8') as file:
+            file.write(text + '\n')
+    sys.stdout.write(text + '\n')
+    sys.exit(1 if summary['failed'] else 0)
@@ -0,0 +1,247 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import ru_local as ru
+import import_financial_data_ru as fdi
+import catigorize as cat
+import statistic as stat
+import planing as plan
+import category_cache as cc
+import profiling as prof
+import report_render as render
+import main
+
+
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+
+# Top-level stages of main(), they add up to the whole run.
+# 'roles 1-3' also contains the stages 'role 1', 'role 2' and 'role 3'.
+MAIN_STAGES = ('roles 1-3', 'role 4', 'report')
+
+# Phrases around the keywords of create_categories().
+EXPENSE_TEMPLATES = ('{}', 'Покупка: {}', 'Оплата {}', '{} онлайн', 'Счёт {}')
+UNKNOWN_EXPENSES = ('Стрижка в барбершопе', 'Кофе в кофейне', 'Подарок другу',
+                    'Цветы', 'Ремонт телефона', 'Химчистка')
+INCOMES = ('Зарплата', 'Аванс', 'Премия', 'Частный заказ на разработку',
+           'Кэшбэк', 'Проценты по вкладу')
+
+
+def generate_transactions(rows: int, seed: int = 0, start: date = date(2020, 1, 1),
+                          days: int = 5 * 365):
+    '''
+    Generator of synthetic statement records
+    {"date": ..., "amount": ..., "description": ..., "type": ...}.
+
+    Descriptions of expenses are made from the keywords of create_categories(),
+    about 10% are unknown to the categorizer; about 8% of records are income.
+    '''
+    generator = random.Random(seed)
+    keywords = [keyword for keywords in cat.create_categories().values()
+                for keyword in keywords]
+
+    for _ in range(rows):
+        day = (start + timedelta(days=generator.randrange(days))).isoformat()
+        kind = generator.random()
+        if kind < 0.08:
+            yield {'date': day,
+                   'amount': round(generator.uniform(5000, 150000), 2),
+                   'description': generator.choice(INCOMES),
+                   'type': ru.INCOME}
+            continue
+
+        if kind < 0.18:
+            description = generator.choice(UNKNOWN_EXPENSES)
+        else:
+            keyword = generator.choice(keywords)
+            description = generator.choice(EXPENSE_TEMPLATES).format(keyword.capitalize())
+        yield {'date': day,
+               'amount': round(generator.lognormvariate(6.5, 1.2), 2),
+               'description': description,
+               'type': ru.EXPENSE}
+
+
+def write_statement(filename: str, records, with_type: bool = True) -> None:
+    '''
+    Writes records in one of the formats import_financial_data accepts,
+    chosen by the extension: .csv, .json (array) or .jsonl.
+    Without the type field expenses get a negative amount.
+    '''
+    def prepared():
+        for record in records:
+            if not with_type:
+                sign = -1 if record['type'] == ru.EXPENSE else 1
+                record = {'date': record['date'],
+                          'amount': sign * record['amount'],
+                          'description': record['description']}
+            yield record
+
+    extension = filename.split(sep='.')[-1]
+    fields = ['date', 'amount', 'description'] + (['type'] if with_type else [])
+
+    with open(filename, mode='w', encoding='UTF-8', newline='') as file:
+        if extension == 'csv':
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(prepared())
+        elif extension == 'json':
+            # Written element by element, so the list is never built in memory.
+            file.write('[\n')
+            for i, record in enumerate(prepared()):
+                if i:
+                    file.write(',\n')
+                file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n]\n')
+        elif extension in ('jsonl', 'ndjson'):
+            for record in prepared():
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            raise ValueError('unknown data format')
+
+
+class StageTimer:
+    '''
+    Takes the place of profiling.Profiler for the stages of main()
+    (profiling.stage) and records only their wall time: no tracemalloc
+    and no wrapped functions, so the measured code runs as it ships.
+    '''
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield {}
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0) + time.perf_counter() - started
+
+
+def run_pipeline(filename: str) -> dict:
+    '''
+    Runs the file through main.build_report and report_render.write_report,
+    as main() does, and returns seconds per stage of main().
+    '''
+    timer = StageTimer()
+    cache = cc.CategoryCache(cat.create_categories())
+    prof.active = timer
+    try:
+        # The progress bar of tqdm is not part of the measurement output.
+        with contextlib.redirect_stderr(io.StringIO()):
+            report_data = main.build_report(filename, cache)
+        with prof.stage('report'):
+            render.write_report('console', report_data, io.StringIO())
+    finally:
+        prof.active = None
+    return timer.seconds
+
+
+def run_baseline(filename: str) -> dict:
+    '''
+    Runs the list functions of statistic.py and planing.py one after
+    another, as main() did before the one-pass ReportAccumulator, and
+    returns seconds per stage. Only a baseline to compare with run_pipeline.
+    '''
+    timings = {}
+
+    def timed(stage, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        timings[stage] = timings.get(stage, 0) + time.perf_counter() - started
+        return result
+
+    # The progress bar of tqdm is not part of the measurement output.
+    with contextlib.redirect_stderr(io.StringIO()):
+        transactions = timed('import', fdi.import_financial_data, filename)
+    categorized = timed('categorize', cat.categorize_all_transactions, transactions)
+
+    stats = timed('stats', stat.calculate_basic_stats, categorized)
+    category_stats = timed('stats', stat.calculate_by_category, categorized)
+    time_stats = timed('stats', stat.analyze_by_time, categorized)
+
+    analysis = timed('planning', plan.analyze_historical_spending, categorized)
+    budget = timed('planning', plan.create_budget_template, time_stats, analysis)
+    report_budget = timed('planning', plan.compare_budget_vs_actual, budget)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        timed('report', main.print_report, stats, category_stats, time_stats,
+              analysis, report_budget)
+    return timings
+
+
+def _seconds(timings: dict) -> dict:
+    return {stage: round(value, 6) for stage, value in timings.items()}
+
+
+def benchmark(sizes, formats, directory: str, seed: int = 0,
+              with_type: bool = True, baseline: bool = False) -> list:
+    '''
+    Generates a statement for every size and format, runs the pipeline
+    and returns one result dictionary per run.
+    With baseline=True the legacy list functions are timed too
+    ('baseline seconds').
+    '''
+    results = []
+    for rows in sizes:
+        for file_format in formats:
+            filename = os.path.join(directory, f'synthetic_{rows}.{file_format}')
+            write_statement(filename, generate_transactions(rows, seed), with_type)
+
+            timings = run_pipeline(filename)
+            total = sum(timings.get(stage, 0) for stage in MAIN_STAGES)
+            result = {'rows': rows,
+                      'format': file_format,
+                      'file size': os.path.getsize(filename),
+                      'seconds': _seconds(timings),
+                      'total seconds': round(total, 6),
+                      'rows per second': round(rows / total) if total else None}
+            if baseline:
+                baseline_timings = run_baseline(filename)
+                result['baseline seconds'] = _seconds(baseline_timings)
+                result['baseline total seconds'] = round(sum(baseline_timings.values()), 6)
+            results.append(result)
+            os.remove(filename)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Throughput benchmark on synthetic statements.')
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--formats', nargs='+', default=['csv'],
+                        choices=['csv', 'json', 'jsonl'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--without-type', action='store_true',
+                        help='write statements without the type field')
+    parser.add_argument('--baseline', action='store_true',
+                        help='also time the legacy list functions for comparison')
+    parser.add_argument('--dir', default=None,
+                        help='directory for generated files (default: temporary)')
+    parser.add_argument('--output', default=None,
+                        help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        results = benchmark(args.rows, args.formats, args.dir or temporary,
+                            args.seed, not args.without_type, args.baseline)
+
+    summary = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'results': results}
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, mode='w', encoding='UTF-8') as file:
+            file.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
@@ -1,2 +1,2 @@
-first_group = ['жилье', 'быт', 'еда', 'транспорт', 'здоровье']
+first_group = ['жильё', 'быт', 'еда', 'транспорт', 'здоровье']
 second_group = ['развлечения', 'одежда', 'образование']
\ No newline at end of file
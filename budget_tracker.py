@@ -0,0 +1,176 @@
+import argparse
+import json
+import sys
+
+import ru_local as ru
+import import_financial_data_ru as fdi
+import catigorize as cat
+import statistic as stat
+import budget_category
+
+
+# Recommended shares of a month, percent: {group : (lowest, highest), ...}
+#   1 - essentials (budget_category.first_group)
+#   2 - lifestyle (budget_category.second_group)
+#   3 - savings (income - expenses)
+BANDS = {1: (45, 55), 2: (25, 35), 3: (15, 25)}
+
+# Groups whose highest share is outside the band, as in
+# planing.compare_budget_vs_actual (savings must be below 25%).
+OPEN_HIGH = frozenset({3})
+
+FIRST_GROUP = frozenset(budget_category.first_group)
+SECOND_GROUP = frozenset(budget_category.second_group)
+
+
+class BudgetTracker:
+    '''
+    Budget compliance of every month, updated transaction by transaction.
+
+    For every month it keeps essentials and lifestyle expenses (type "расход"
+    of the categories of budget_category), income and all expenses, as
+    create_budget_template counts them. A transaction changes only its own
+    month, so the shares are updated in constant time and the history is
+    never recomputed.
+
+    The shares of a month are percentages of essentials + lifestyle + savings.
+    An event is emitted when a share leaves its band of BANDS ('breach')
+    and when it comes back ('recovery'). The first evaluation of a month
+    only sets its state, so a month that starts out of a band emits nothing.
+    '''
+
+    def __init__(self, on_event=None):
+        '''
+        on_event(event) is called for every event, if given.
+        '''
+        self.on_event = on_event
+        # {(year, month) : [essentials, lifestyle, income, expenses], ...}
+        self.months = {}
+        # {(year, month) : {group : share is in its band, None before
+        # the first evaluation, ...}, ...}
+        self.in_band = {}
+
+    def shares(self, month: tuple) -> dict:
+        '''
+        {group : percent, ...} of the month, empty if nothing can be shared yet.
+        '''
+        essentials, lifestyle, income, expenses = self.months[month]
+        parts = {1: essentials, 2: lifestyle, 3: income - expenses}
+        total = sum(parts.values())
+        if total <= 0:
+            return {}
+        return {group: round(value / total * 100, 2) for group, value in parts.items()}
+
+    def add(self, transaction) -> list:
+        '''
+        Adds one transaction [date, amount, description, type, category]
+        and returns the events it caused.
+        '''
+        amount = transaction[1]
+        transaction_type = transaction[3]
+        category = transaction[4]
+        month = stat.period_key(transaction[0])
+
+        totals = self.months.get(month)
+        if totals is None:
+            totals = self.months[month] = [0, 0, 0, 0]
+            self.in_band[month] = dict.fromkeys(BANDS)
+
+        if transaction_type == ru.INCOME:
+            totals[2] += amount
+        else:
+            totals[3] += amount
+            if transaction_type == ru.EXPENSE:
+                if category in FIRST_GROUP:
+                    totals[0] += amount
+                elif category in SECOND_GROUP:
+                    totals[1] += amount
+
+        events = []
+        in_band = self.in_band[month]
+        for group, share in self.shares(month).items():
+            low, high = BANDS[group]
+            inside = low <= share < high if group in OPEN_HIGH else low <= share <= high
+            previous = in_band[group]
+            in_band[group] = inside
+            if previous is not None and inside != previous:
+                events.append({'event': 'recovery' if inside else 'breach',
+                               'date': transaction[0],
+                               'month': month,
+                               'group': group,
+                               'share': share,
+                               'band': BANDS[group]})
+
+        if self.on_event is not None:
+            for event in events:
+                self.on_event(event)
+        return events
+
+    def feed(self, transactions):
+        '''
+        Generator of the events of a stream of transactions, for live monitoring.
+        '''
+        for transaction in transactions:
+            yield from self.add(transaction)
+
+    def compliance(self) -> dict:
+        '''
+        {(year, month) : {'shares' : {group : percent, ...}, 'compliant' : bool}, ...}
+        A month is compliant when all its shares are in their bands.
+        '''
+        result = {}
+        for month in self.months:
+            shares = self.shares(month)
+            result[month] = {'shares': shares,
+                             'compliant': bool(shares) and all(self.in_band[month].values())}
+        return result
+
+
+def _json_ready(value: dict) -> dict:
+    '''
+    Event or compliance of a month with the month as 'YYYY-MM'.
+    '''
+    value = dict(value)
+    if 'month' in value:
+        year, month = value['month']
+        value['month'] = f'{year:04d}-{month:02d}'
+    return value
+
+
+def iter_stdin_transactions():
+    '''
+    Transactions of JSON Lines records read from stdin as they arrive.
+    '''
+    keys = None
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        keys = keys or fdi.find_keys(record)
+        yield fdi.convert_record(record, keys)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Prints budget breach events as JSON lines while reading transactions.')
+    parser.add_argument('filename', help="data file, or '-' for JSON Lines on stdin")
+    parser.add_argument('--summary', action='store_true',
+                        help='print the compliance of every month at the end')
+    args = parser.parse_args()
+
+    def write_event(event: dict) -> None:
+        sys.stdout.write(json.dumps(_json_ready(event), ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+
+    tracker = BudgetTracker(write_event)
+    if args.filename == '-':
+        transactions = iter_stdin_transactions()
+    else:
+        transactions = fdi.iter_financial_data(args.filename)
+    for transaction in cat.iter_categorized_transactions(transactions):
+        tracker.add(transaction)
+
+    if args.summary:
+        for month, info in tracker.compliance().items():
+            write_event({'month': month, **info})
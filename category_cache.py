@@ -0,0 +1,110 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_FILE = '.category_cache.json'
+
+
+def normalize_description(description: str) -> str:
+    '''
+    Brings a description to the form used for keyword search.
+    Descriptions with the same normalized form always get the same category.
+    '''
+    return description.lower()
+
+
+def keywords_fingerprint(categories: dict) -> str:
+    '''
+    Returns a hash of the keyword table. Category order is part of the
+    hash, because the first matching category wins.
+    '''
+    table = json.dumps(list(categories.items()), ensure_ascii=False)
+    return hashlib.sha256(table.encode('UTF-8')).hexdigest()
+
+
+class CategoryCache:
+    '''
+    Cache "normalized description -> category" with LRU eviction.
+
+    The cache remembers the fingerprint of the keyword table it was
+    filled with. A saved cache is ignored on load if the table changed.
+    '''
+
+    def __init__(self, categories: dict, max_size: int = 100000):
+        self.fingerprint = keywords_fingerprint(categories)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, description: str):
+        '''
+        Returns the cached category or None and updates hit/miss counters.
+        '''
+        key = normalize_description(description)
+        category = self._entries.get(key)
+        if category is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return category
+
+    def put(self, description: str, category: str) -> None:
+        '''
+        Saves the category, evicting the least recently used entry
+        when the cache is full.
+        '''
+        key = normalize_description(description)
+        self._entries[key] = category
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        '''
+        Returns hit and miss counts and the current size of the cache.
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)}
+
+    def save(self, filename: str) -> None:
+        '''
+        Writes the cache to a JSON file, keeping the LRU order.
+        '''
+        data = {'fingerprint': self.fingerprint,
+                'entries': list(self._entries.items())}
+        with open(filename, mode='w', encoding='UTF-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename: str, categories: dict,
+             max_size: int = 100000) -> 'CategoryCache':
+        '''
+        Reads a cache saved by save().
+        Returns an empty cache if the file is missing, damaged
+        or was filled with another keyword table.
+        '''
+        cache = cls(categories, max_size)
+        try:
+            with open(filename, mode='r', encoding='UTF-8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return cache
+
+        if not isinstance(data, dict) or data.get('fingerprint') != cache.fingerprint:
+            return cache
+
+        try:
+            for key, category in data.get('entries', [])[-max_size:]:
+                cache._entries[key] = category
+        except (TypeError, ValueError):
+            # Hand-edited or damaged entries: start with an empty cache.
+            return cls(categories, max_size)
+        return cache
@@ -1,4 +1,5 @@
 import ru_local as ru
+import records
 
 
 def create_categories() -> dict:
@@ -42,12 +43,119 @@ def create_categories() -> dict:
 
 
 
-def categorize_transaction(description: str, categories: dict) -> str:
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton built over all keywords of the categories.
+
+    The description is scanned once, character by character, and every
+    keyword found in it is reported at the same time. Each node of the
+    automaton stores the index of the first category (in dict order)
+    whose keyword ends there, so the "first category wins" rule of the
+    plain nested loop is preserved.
+    """
+
+    def __init__(self, categories: dict):
+        self.categories = list(categories)
+        # Index meaning "no keyword found".
+        self._none = len(self.categories)
+
+        # Transitions, failure links and best category index for each node.
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [self._none]
+
+        for index, keywords in enumerate(categories.values()):
+            for keyword in keywords:
+                node = 0
+                for char in keyword:
+                    next_node = self._goto[node].get(char)
+                    if next_node is None:
+                        next_node = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._best.append(self._none)
+                        self._goto[node][char] = next_node
+                    node = next_node
+                self._best[node] = min(self._best[node], index)
+
+        # Breadth-first pass: failure links point to the longest proper
+        # suffix that is also a prefix of some keyword.
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._best[child] = min(self._best[child], self._best[fail])
+                queue.append(child)
+
+        # Full transition table, filled lazily for the characters that
+        # actually occur in descriptions.
+        self._delta = [dict(transitions) for transitions in self._goto]
+
+    def _step(self, node: int, char: str) -> int:
+        """
+        Follows failure links to find the transition and memoizes it.
+        """
+        state = node
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        next_node = self._goto[state].get(char, 0)
+        self._delta[node][char] = next_node
+        return next_node
+
+    def match(self, description: str) -> str:
+        """
+        Returns the first category (in dict order) that has a keyword
+        inside the lowercased description, or "другое".
+        """
+        delta, best_at = self._delta, self._best
+        best = best_at[0]
+        node = 0
+
+        for char in description.lower():
+            next_node = delta[node].get(char)
+            if next_node is None:
+                next_node = self._step(node, char)
+            node = next_node
+            if best_at[node] < best:
+                best = best_at[node]
+                # Nothing can beat the first category.
+                if best == 0:
+                    break
+
+        if best == self._none:
+            return "другое"
+        return self.categories[best]
+
+
+_default_matcher = None
+
+
+def get_default_matcher() -> KeywordMatcher:
+    """
+    Returns the matcher for create_categories(), building it on first use.
+    """
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = KeywordMatcher(create_categories())
+    return _default_matcher
+
+
+def categorize_transaction(description: str, categories) -> str:
     """
     Reduce the description to lowercase
     Check if a keyword is included in the description.
     If found, return the category. If you haven't found it, return "другое"
+
+    categories can be a dictionary from create_categories()
+    or a prebuilt KeywordMatcher.
     """
+    if isinstance(categories, KeywordMatcher):
+        return categories.match(description)
+
     description_lower = description.lower()
 
     for category, keywords in categories.items():
@@ -57,23 +165,55 @@ def categorize_transaction(description: str, categories: dict) -> str:
     return "другое"
 
 
-def categorize_all_transactions(transactions: list) -> list:
+def iter_categorized_transactions(transactions, cache=None, sketches=None):
     """
-    Accepts a list of transactions in the format:
-        [[date, amount, description, type], ... ]
-
-    Returns: [[date, amount, description, type, category], ... ]
+    Generator version of categorize_all_transactions.
+    Accepts any iterable of [date, amount, description, type]
+    and yields [date, amount, description, type, category] one at a time.
+    Fields after the type (the account) are kept after the category:
+    [date, amount, description, type, account] gives
+    [date, amount, description, type, category, account].
+    Compact records are yielded as compact records with the category set.
+    If SpendingSketches are given, every categorized transaction is added to them.
     """
-    categories = create_categories()
-    result = []
+    matcher = get_default_matcher()
 
     for trans in transactions:
         date, amount, description, trans_type = trans[0], trans[1], trans[2], trans[3]
         if trans_type == ru.INCOME:
             category = ru.INCOME
+        elif cache is None:
+            category = matcher.match(description)
+        else:
+            category = cache.get(description)
+            if category is None:
+                category = matcher.match(description)
+                cache.put(description, category)
+
+        if isinstance(trans, records.Transaction):
+            categorized = trans.with_category(category)
         else:
-            category = categorize_transaction(description, categories)
+            categorized = [date, amount, description, trans_type, category]
+            if len(trans) > 4:
+                categorized += trans[4:]
+        if sketches is not None:
+            sketches.add(categorized)
+        yield categorized
+
 
-        new_transaction = [date, amount, description, trans_type, category]
-        result.append(new_transaction)
-    return result
+def categorize_all_transactions(transactions: list, cache=None, sketches=None) -> list:
+    """
+    Accepts a list of transactions in the format:
+        [[date, amount, description, type], ... ]
+
+    Returns: [[date, amount, description, type, category], ... ]
+
+    If a CategoryCache is given, repeated descriptions are taken
+    from it instead of searching the keywords again.
+    A TransactionList of compact records gives a TransactionList.
+    If SpendingSketches are given, they are filled during categorization.
+    """
+    categorized = iter_categorized_transactions(transactions, cache, sketches)
+    if isinstance(transactions, records.TransactionList):
+        return records.TransactionList(categorized, transactions.tables)
+    return list(categorized)
@@ -0,0 +1,226 @@
+import ru_local as ru
+import statistic as stat
+
+# numpy is optional: without it the columnar backend is unavailable,
+# the rest of the program works with lists of transactions.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TransactionColumns(stat.StatisticsMixin):
+    '''
+    Columnar storage of categorized transactions.
+
+    Columns:
+        dates - numpy datetime64[D] array
+        amounts - numpy float64 array
+        types, categories - small integer codes, the names are
+            in type_names and category_names (in order of first appearance)
+        descriptions - list of strings
+    '''
+
+    def __init__(self, transactions):
+        '''
+        Builds the columns from any iterable of
+        [date, amount, description, type, category].
+        '''
+        if np is None:
+            raise ImportError('numpy is required for the columnar backend')
+
+        dates = []
+        amounts = []
+        self.descriptions = []
+        types = []
+        categories = []
+        type_codes = {}
+        category_codes = {}
+
+        for transaction in transactions:
+            dates.append(transaction[0])
+            amounts.append(transaction[1])
+            self.descriptions.append(transaction[2])
+            types.append(type_codes.setdefault(transaction[3], len(type_codes)))
+            categories.append(category_codes.setdefault(transaction[4],
+                                                        len(category_codes)))
+
+        self.type_names = list(type_codes)
+        self.category_names = list(category_codes)
+        self.dates = np.array(dates, dtype='datetime64[D]')
+        self.amounts = np.array(amounts, dtype=np.float64)
+        self.types = np.array(types, dtype=np.int8 if len(type_codes) < 128
+                              else np.int32)
+        self.categories = np.array(categories, dtype=np.int16
+                                   if len(category_codes) < 32768 else np.int32)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __iter__(self):
+        '''
+        Yields transactions as [date, amount, description, type, category],
+        so the store can be passed wherever a list of transactions is expected.
+        '''
+        dates = np.datetime_as_string(self.dates).tolist()
+        amounts = self.amounts.tolist()
+        types = self.types.tolist()
+        categories = self.categories.tolist()
+        for i in range(len(amounts)):
+            yield [dates[i], amounts[i], self.descriptions[i],
+                   self.type_names[types[i]], self.category_names[categories[i]]]
+
+    def type_mask(self, name: str):
+        '''
+        Returns a boolean array: True for transactions of the given type.
+        '''
+        if name not in self.type_names:
+            return np.zeros(len(self.amounts), dtype=bool)
+        return self.types == self.type_names.index(name)
+
+    def periods(self):
+        '''
+        Returns the number of months since 1970-01 of every transaction.
+        Use period_of() to turn it into (year, month).
+        '''
+        return self.dates.astype('datetime64[M]').astype(np.int64)
+
+
+def period_of(months_since_epoch: int) -> tuple:
+    '''
+    Converts a value of TransactionColumns.periods() to (year, month).
+    '''
+    year, month = divmod(months_since_epoch, 12)
+    return 1970 + year, month + 1
+
+
+def _group(keys, weights, size: int) -> tuple:
+    '''
+    Sums weights and counts elements for every key in range(size).
+    np.bincount adds values in order, so sums match a plain Python loop.
+    '''
+    sums = np.bincount(keys, weights=weights, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    return sums, counts
+
+
+def _first_appearance(keys) -> list:
+    '''
+    Returns the distinct keys in order of their first appearance.
+    '''
+    unique_keys, first_index = np.unique(keys, return_index=True)
+    return unique_keys[np.argsort(first_index)].tolist()
+
+
+def _total(value: float, count: int):
+    '''
+    An empty group gives 0 like the loop version, not 0.0.
+    '''
+    return float(value) if count else 0
+
+
+def calculate_basic_stats(columns: TransactionColumns) -> dict:
+    '''
+    Vectorized statistic.calculate_basic_stats.
+    '''
+    income_mask = columns.type_mask(ru.INCOME)
+    sums, counts = _group(income_mask.astype(np.int64), columns.amounts, 2)
+
+    total_income = _total(sums[1], counts[1])
+    total_expenses = _total(sums[0], counts[0])
+
+    return {ru.INCOME: total_income,
+            ru.EXPENSE: total_expenses,
+            ru.BALANCE: total_income - total_expenses,
+            ru.TRANSACTIONS_QUANTITY: len(columns)}
+
+
+def calculate_by_category(columns: TransactionColumns) -> dict:
+    '''
+    Vectorized statistic.calculate_by_category.
+    '''
+    expense_mask = ~columns.type_mask(ru.INCOME)
+    codes = columns.categories[expense_mask].astype(np.int64)
+    amounts = columns.amounts[expense_mask]
+
+    total_expenses = calculate_basic_stats(columns)[ru.EXPENSE]
+    sums, counts = _group(codes, amounts, len(columns.category_names))
+
+    category_info = {}
+    for code in _first_appearance(codes):
+        total_sum = float(sums[code])
+        percent = round(total_sum / total_expenses * 100, 2)
+        category_info[columns.category_names[code]] = [total_sum, int(counts[code]),
+                                                       percent]
+    return category_info
+
+
+def _period_codes(columns: TransactionColumns) -> tuple:
+    '''
+    Returns period codes starting from 0, the first period
+    and the number of periods between the first and the last one.
+    '''
+    periods = columns.periods()
+    if len(periods) == 0:
+        return periods, 0, 0
+    first = int(periods.min())
+    return periods - first, first, int(periods.max()) - first + 1
+
+
+def analyze_by_time(columns: TransactionColumns) -> dict:
+    '''
+    Vectorized statistic.analyze_by_time.
+    '''
+    periods, first, period_number = _period_codes(columns)
+    income_mask = columns.type_mask(ru.INCOME).astype(np.int64)
+    categories = columns.categories.astype(np.int64)
+    category_number = len(columns.category_names)
+
+    # Income and expenses for every (period, is income) pair.
+    sums, counts = _group(periods * 2 + income_mask, columns.amounts,
+                          period_number * 2)
+
+    # Number of transactions and first appearance for every (period, category).
+    pair_keys = periods * category_number + categories
+    pair_counts = np.bincount(pair_keys, minlength=period_number * category_number)
+    unique_pairs, first_index = np.unique(pair_keys, return_index=True)
+    pair_first = dict(zip(unique_pairs.tolist(), first_index.tolist()))
+
+    month_info = {}
+    for period in _first_appearance(periods):
+        period_counts = pair_counts[period * category_number:
+                                    (period + 1) * category_number]
+        n = period_counts.max()
+        popular_codes = np.flatnonzero(period_counts == n).tolist()
+        popular_codes.sort(key=lambda code: pair_first[period * category_number + code])
+
+        month_info[period_of(first + period)] = {
+            ru.INCOME: _total(sums[period * 2 + 1], counts[period * 2 + 1]),
+            ru.EXPENSE: _total(sums[period * 2], counts[period * 2]),
+            ru.POPULAR_CATEGORIES: [columns.category_names[code]
+                                    for code in popular_codes]}
+    return month_info
+
+
+def expenses_by_month(columns: TransactionColumns) -> dict:
+    '''
+    Vectorized grouping for planing.analyze_historical_spending:
+    {(year, month) : {category_1 : expenses, category_2 : expenses, ...}, ...}
+    '''
+    periods, first, period_number = _period_codes(columns)
+    expense_mask = columns.type_mask(ru.EXPENSE)
+    category_number = len(columns.category_names)
+
+    pair_keys = (periods * category_number
+                 + columns.categories.astype(np.int64))[expense_mask]
+    sums = np.bincount(pair_keys, weights=columns.amounts[expense_mask],
+                       minlength=period_number * category_number)
+
+    # Periods keep the order of all transactions, also periods without expenses.
+    months_data = {period_of(first + period): {}
+                   for period in _first_appearance(periods)}
+    for key in _first_appearance(pair_keys):
+        period, code = divmod(key, category_number)
+        months_data[period_of(first + period)][columns.category_names[code]] = \
+            float(sums[key])
+    return months_data
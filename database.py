@@ -0,0 +1,184 @@
+import itertools
+import sqlite3
+
+import ru_local as ru
+import statistic as stat
+
+
+# Rows sent to the database by one executemany() call.
+BATCH_SIZE = 10000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL
+)
+'''
+
+# transactions_month lets the GROUP BY year, month queries read the rows
+# in index order instead of sorting the table. Within a month the index
+# keeps the order of id, so the sums are added in the order of the data.
+# (year, month, category) would add them by category and change the last
+# digits of the monthly sums.
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS transactions_month ON transactions (year, month)',
+    'CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date)',
+    'CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category)',
+    'CREATE INDEX IF NOT EXISTS transactions_type ON transactions (type)',
+)
+
+
+class TransactionDatabase(stat.StatisticsMixin):
+    '''
+    Categorized transactions stored in an SQLite database.
+
+    Table transactions: date, year, month, amount, description, type,
+    category. id is the position of the transaction in the data,
+    MIN(id) of a group gives the order of first appearance that the
+    list functions keep in their dictionaries.
+
+    The statistics functions in statistic.py and planing.py run
+    as GROUP BY queries when they get this object, so only the small
+    aggregated results are ever held in memory.
+    '''
+
+    def __init__(self, filename: str = ':memory:'):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(SCHEMA)
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def __iter__(self):
+        '''
+        Yields transactions as [date, amount, description, type, category]
+        in the order of the data.
+        '''
+        cursor = self.connection.execute(
+            'SELECT date, amount, description, type, category '
+            'FROM transactions ORDER BY id')
+        for row in cursor:
+            yield list(row)
+
+    def clear(self) -> None:
+        '''
+        Deletes all transactions.
+        '''
+        with self.connection:
+            self.connection.execute('DELETE FROM transactions')
+
+    def add_all(self, transactions, batch_size: int = BATCH_SIZE) -> 'TransactionDatabase':
+        '''
+        Inserts every transaction of any iterable of
+        [date, amount, description, type, category] and returns the database.
+
+        Rows are sent in batches by executemany() inside one transaction,
+        the indexes are built after the insert.
+        '''
+        rows = ((transaction[0], *stat.period_key(transaction[0]), transaction[1],
+                 transaction[2], transaction[3], transaction[4])
+                for transaction in transactions)
+
+        with self.connection:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                self.connection.executemany(
+                    'INSERT INTO transactions '
+                    '(date, year, month, amount, description, type, category) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+            for index in INDEXES:
+                self.connection.execute(index)
+        return self
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def calculate_basic_stats(database: TransactionDatabase) -> dict:
+    '''
+    Same result as statistic.calculate_basic_stats.
+    '''
+    total_income, total_expenses, quantity = database.connection.execute(
+        'SELECT COALESCE(SUM(CASE WHEN type = ? THEN amount END), 0), '
+        'COALESCE(SUM(CASE WHEN type != ? THEN amount END), 0), '
+        'COUNT(*) FROM transactions', (ru.INCOME, ru.INCOME)).fetchone()
+
+    return {ru.INCOME: total_income,
+            ru.EXPENSE: total_expenses,
+            ru.BALANCE: total_income - total_expenses,
+            ru.TRANSACTIONS_QUANTITY: quantity}
+
+
+def calculate_by_category(database: TransactionDatabase) -> dict:
+    '''
+    Same result as statistic.calculate_by_category.
+    '''
+    rows = database.connection.execute(
+        'SELECT category, SUM(amount), COUNT(*) FROM transactions '
+        'WHERE type != ? GROUP BY category ORDER BY MIN(id)', (ru.INCOME,)).fetchall()
+    total_expenses = database.connection.execute(
+        'SELECT SUM(amount) FROM transactions WHERE type != ?', (ru.INCOME,)).fetchone()[0]
+
+    category_info = {}
+    for category, total_sum, quantity in rows:
+        percent = round(total_sum / total_expenses * 100, 2)
+        category_info[category] = [total_sum, quantity, percent]
+    return category_info
+
+
+def analyze_by_time(database: TransactionDatabase) -> dict:
+    '''
+    Same result as statistic.analyze_by_time.
+    '''
+    month_info = {}
+    for year, month, income, expenses in database.connection.execute(
+            'SELECT year, month, '
+            'COALESCE(SUM(CASE WHEN type = ? THEN amount END), 0), '
+            'COALESCE(SUM(CASE WHEN type != ? THEN amount END), 0) '
+            'FROM transactions GROUP BY year, month ORDER BY MIN(id)',
+            (ru.INCOME, ru.INCOME)):
+        month_info[(year, month)] = {ru.INCOME: income,
+                                     ru.EXPENSE: expenses,
+                                     ru.POPULAR_CATEGORIES: []}
+
+    # {(year, month) : number of transactions of the most popular category}
+    most_popular = {}
+    for year, month, category, quantity in database.connection.execute(
+            'SELECT year, month, category, COUNT(*) FROM transactions '
+            'GROUP BY year, month, category ORDER BY MIN(id)'):
+        period = (year, month)
+        n = most_popular.get(period, 0)
+        if quantity > n:
+            most_popular[period] = quantity
+            month_info[period][ru.POPULAR_CATEGORIES] = [category]
+        elif quantity == n:
+            month_info[period][ru.POPULAR_CATEGORIES].append(category)
+    return month_info
+
+
+def expenses_by_month(database: TransactionDatabase) -> dict:
+    '''
+    Expenses of type "расход" by month and category, the input
+    of planing.summarize_months_data. Months without such expenses
+    are present with an empty dictionary.
+    '''
+    months_data = {}
+    for year, month in database.connection.execute(
+            'SELECT year, month FROM transactions GROUP BY year, month ORDER BY MIN(id)'):
+        months_data[(year, month)] = {}
+
+    for year, month, category, expenses in database.connection.execute(
+            'SELECT year, month, category, SUM(amount) FROM transactions '
+            'WHERE type = ? GROUP BY year, month, category ORDER BY MIN(id)',
+            (ru.EXPENSE,)):
+        months_data[(year, month)][category] = expenses
+    return months_data
@@ -0,0 +1,155 @@
+import argparse
+import json
+import math
+import re
+import sys
+from collections import OrderedDict
+
+import import_financial_data_ru as fdi
+
+
+# Largest number of keys kept in the index. The least recently seen
+# keys are forgotten first, so memory does not grow with the feed.
+DEFAULT_MAX_KEYS = 1_000_000
+
+# Number of dropped rows kept for the report (all of them are counted).
+DEFAULT_MAX_REPORT = 100
+
+WORD = re.compile(r'\w+')
+
+
+def normalize_description(description: str) -> str:
+    '''
+    Description without case, punctuation and extra spaces, ё as е:
+    'Продукты в "Пятёрочке"!' -> 'продукты в пятерочке'
+    '''
+    return ' '.join(WORD.findall(description.lower().replace('ё', 'е')))
+
+
+class DuplicateFilter:
+    '''
+    Finds repeated transactions while they are read, in O(1) per row.
+
+    The index is a hash table on (date, amount, normalized description, type).
+    With a tolerance, amounts within it are the same: the amount is put
+    into a bucket of the tolerance size and the neighbouring buckets are
+    checked too.
+
+    Rows come from sources (files). A row is a duplicate if a previous
+    source already had as many rows with its key, so a statement exported
+    twice is counted once, while equal purchases of one statement are kept.
+    With strict=True every repeated key is a duplicate, even in one source.
+
+    The index keeps at most max_keys keys (least recently seen are forgotten
+    first), so a duplicate further apart than that is not found.
+    '''
+
+    def __init__(self, tolerance: float = 0, strict: bool = False,
+                 max_keys: int = DEFAULT_MAX_KEYS, max_report: int = DEFAULT_MAX_REPORT):
+        self.tolerance = tolerance
+        self.strict = strict
+        self.max_keys = max_keys
+        self.max_report = max_report
+        # {key : [kept rows, last source, rows of the last source, amount], ...}
+        self.index = OrderedDict()
+        self.read = 0
+        self.dropped = 0
+        # [(source, transaction), ...] first max_report dropped rows.
+        self.dropped_rows = []
+
+    def _amount_key(self, amount: float) -> int:
+        if self.tolerance:
+            return math.floor(amount / self.tolerance)
+        return round(amount * 100)
+
+    def _find(self, transaction) -> tuple:
+        '''
+        (key, entry) of the transaction; entry is None for a new key.
+        '''
+        date, amount = transaction[0].strip(), transaction[1]
+        rest = (normalize_description(transaction[2]), transaction[3])
+        bucket = self._amount_key(amount)
+        key = (date, bucket) + rest
+        if not self.tolerance:
+            return key, self.index.get(key)
+
+        for near in (bucket, bucket - 1, bucket + 1):
+            entry = self.index.get((date, near) + rest)
+            if entry is not None and abs(entry[3] - amount) <= self.tolerance:
+                return (date, near) + rest, entry
+        return key, None
+
+    def is_duplicate(self, transaction, source=None) -> bool:
+        '''
+        Adds a transaction [date, amount, description, type, ...] of a source
+        to the index and tells whether it is a duplicate.
+        '''
+        self.read += 1
+        key, entry = self._find(transaction)
+        if entry is None:
+            self.index[key] = [1, source, 1, transaction[1]]
+            if len(self.index) > self.max_keys:
+                self.index.popitem(last=False)
+            return False
+
+        self.index.move_to_end(key)
+        if not self.strict:
+            if entry[1] != source:
+                entry[1], entry[2] = source, 0
+            entry[2] += 1
+            if entry[2] > entry[0]:
+                entry[0] = entry[2]
+                return False
+
+        self.dropped += 1
+        if len(self.dropped_rows) < self.max_report:
+            self.dropped_rows.append((source, list(transaction)))
+        return True
+
+    def filter(self, transactions, source=None):
+        '''
+        Generator of the transactions that are not duplicates.
+        '''
+        for transaction in transactions:
+            if not self.is_duplicate(transaction, source):
+                yield transaction
+
+    def report(self) -> dict:
+        return {'read': self.read,
+                'kept': self.read - self.dropped,
+                'dropped': self.dropped,
+                'dropped rows': [{'source': source, 'transaction': transaction}
+                                 for source, transaction in self.dropped_rows]}
+
+
+def iter_merged_data(filenames: list, duplicates: DuplicateFilter):
+    '''
+    Transactions of several overlapping files in order, without duplicates.
+    '''
+    for filename in filenames:
+        yield from fdi.iter_financial_data(filename, duplicates=duplicates)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Merges overlapping statement files into one JSON Lines file '
+                    'without duplicate transactions.')
+    parser.add_argument('inputs', nargs='+')
+    parser.add_argument('--output', '-o', required=True, help='merged .jsonl file')
+    parser.add_argument('--tolerance', type=float, default=0,
+                        help='amounts that differ by at most this are the same')
+    parser.add_argument('--strict', action='store_true',
+                        help='drop every repeated transaction, also within one file')
+    parser.add_argument('--max-keys', type=int, default=DEFAULT_MAX_KEYS,
+                        help='largest number of transactions kept in the index')
+    args = parser.parse_args()
+
+    duplicates = DuplicateFilter(args.tolerance, args.strict, args.max_keys)
+    with open(args.output, mode='w', encoding='UTF-8') as file:
+        for date, amount, description, transaction_type in iter_merged_data(args.inputs,
+                                                                            duplicates):
+            file.write(json.dumps({'date': date, 'amount': amount,
+                                   'description': description, 'type': transaction_type},
+                                  ensure_ascii=False) + '\n')
+
+    sys.stdout.write(json.dumps(duplicates.report(), ensure_ascii=False, indent=2) + '\n')
@@ -0,0 +1,133 @@
+# numpy is optional: without it forecasts are unavailable,
+# the rest of the program works as before.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Forecast methods:
+#   smoothing - simple exponential smoothing of the monthly expenses
+#   seasonal - the same month of the previous year (seasonal naive),
+#              smoothing for series shorter than a year
+METHODS = ('smoothing', 'seasonal')
+DEFAULT_METHOD = 'smoothing'
+
+# Weight of the latest month in exponential smoothing.
+DEFAULT_ALPHA = 0.5
+
+SEASON_LENGTH = 12
+
+
+def month_number(period: tuple) -> int:
+    '''
+    Number of the month (year, month) counted from year 0.
+    '''
+    year, month = period
+    return year * 12 + month - 1
+
+
+def period_of(number: int) -> tuple:
+    year, month = divmod(number, 12)
+    return year, month + 1
+
+
+def smooth(history, starts, alpha: float = DEFAULT_ALPHA):
+    '''
+    Simple exponential smoothing of every row of history (series x months).
+    A row starts at its column in starts, the level is the first value there.
+    Returns the level after the last month, the forecast of the next one.
+    '''
+    levels = history[:, 0].copy()
+    for column in range(1, history.shape[1]):
+        values = history[:, column]
+        levels = np.where(starts < column, alpha * values + (1 - alpha) * levels, values)
+    return levels
+
+
+def seasonal_naive(history, starts, alpha: float = DEFAULT_ALPHA):
+    '''
+    The value of the same month a year before the next one for rows
+    with a full year of history, smoothing for the others.
+    '''
+    result = smooth(history, starts, alpha)
+    width = history.shape[1]
+    if width >= SEASON_LENGTH:
+        full_year = starts <= width - SEASON_LENGTH
+        result = np.where(full_year, history[:, width - SEASON_LENGTH], result)
+    return result
+
+
+def forecast_many(months_data_list: list, method: str = DEFAULT_METHOD,
+                  alpha: float = DEFAULT_ALPHA) -> list:
+    '''
+    Forecasts the expenses of the next month of every category of many
+    accounts in one call.
+
+    The series of all accounts and categories are put into one matrix
+    aligned on the last month of each account, months without expenses
+    of a category are 0. The methods run over the months with whole
+    columns at once, so the cost of many series is one numpy operation
+    per month of history.
+
+    Args:
+        months_data_list (list): 'category data by month' of every account
+        method (str): one of METHODS
+        alpha (float): weight of the latest month in smoothing
+
+    Returns:
+        list: {'period' : (year, month), 'expenses' : {category : forecast, ...}}
+        of every account, period is the month after the last one of the account
+    '''
+    if np is None:
+        raise ImportError('numpy is required for forecasts')
+    if method not in METHODS:
+        raise ValueError(f'unknown forecast method: {method}')
+
+    # Months of every account, counted from year 0.
+    spans = []
+    for months_data in months_data_list:
+        numbers = [month_number(period) for period in months_data]
+        spans.append((min(numbers), max(numbers)) if numbers else None)
+    width = max((last - first + 1 for first, last in filter(None, spans)), default=1)
+
+    # Series (account, category) and the cells of their history.
+    series = []
+    starts = []
+    rows, columns, values = [], [], []
+    for account, (months_data, span) in enumerate(zip(months_data_list, spans)):
+        if span is None:
+            continue
+        first, last = span
+        row_of = {}
+        for period, month_data in months_data.items():
+            column = width - 1 - (last - month_number(period))
+            for category, value in month_data.items():
+                row = row_of.get(category)
+                if row is None:
+                    row = row_of[category] = len(series)
+                    series.append((account, category))
+                    starts.append(width - 1 - (last - first))
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+
+    history = np.zeros((len(series), width))
+    history[np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)] = values
+    method_function = smooth if method == 'smoothing' else seasonal_naive
+    forecasts = method_function(history, np.array(starts, dtype=np.int64), alpha)
+
+    result = [{'period': None if span is None else period_of(span[1] + 1), 'expenses': {}}
+              for span in spans]
+    for (account, category), value in zip(series, forecasts.tolist()):
+        result[account]['expenses'][category] = round(value, 2)
+    return result
+
+
+def forecast_spending(analysis: dict, method: str = DEFAULT_METHOD,
+                      alpha: float = DEFAULT_ALPHA) -> dict:
+    '''
+    Forecast of the next month of one analysis of analyze_historical_spending:
+    {'period' : (year, month), 'expenses' : {category : forecast, ...}}
+    '''
+    return forecast_many([analysis['category data by month']], method, alpha)[0]
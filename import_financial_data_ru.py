@@ -1,6 +1,105 @@
 import tqdm
+import bz2
 import csv
+import gzip
+import io
+import itertools
 import json
+import lzma
+
+import records
+
+# zstandard is optional: without it .zst files cannot be read,
+# all other files work as before.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SUPPORTED_FORMATS = ('csv', 'json', 'jsonl', 'ndjson')
+
+# Names of the field with the account or user of a transaction.
+ACCOUNT_FIELDS = ('account', 'account_id', 'user', 'user_id', 'customer', 'customer_id')
+
+# Account of the transactions of a file without an account field.
+DEFAULT_ACCOUNT = ''
+
+# Compressed files: {compression : first bytes of the file, ...}
+# The name of the compression is also the extension of the file.
+COMPRESSION_MAGIC = {'gz': b'\x1f\x8b',
+                     'bz2': b'BZh',
+                     'xz': b'\xfd7zXZ\x00',
+                     'zst': b'\x28\xb5\x2f\xfd'}
+
+# Stream openers of the compressions of the standard library.
+OPENERS = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+
+def data_format(filename: str) -> str:
+    '''
+    Format of the data by the file extension, the extension
+    of the compression is skipped: 'data.csv.gz' -> 'csv'.
+    '''
+    parts = filename.split(sep='.')
+    if len(parts) > 2 and parts[-1].lower() in COMPRESSION_MAGIC:
+        return parts[-2]
+    return parts[-1]
+
+
+def detect_compression(filename: str) -> str:
+    '''
+    Compression of the file ('gz', 'bz2', 'xz' or 'zst') by its extension
+    or, for any other extension, by its first bytes. '' for a plain file.
+
+    errors:
+    FileNotFoundError
+    '''
+    extension = filename.split(sep='.')[-1].lower()
+    if extension in COMPRESSION_MAGIC:
+        return extension
+
+    with open(filename, mode='rb') as file:
+        head = file.read(6)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return ''
+
+
+def open_text(filename: str):
+    '''
+    Opens a data file for reading text. A compressed file is decompressed
+    as a stream while it is read: nothing is written to disk and the
+    whole file is never inflated in memory.
+
+    errors:
+    FileNotFoundError
+    ImportError - a .zst file without the zstandard package
+    '''
+    compression = detect_compression(filename)
+    if compression in OPENERS:
+        return OPENERS[compression](filename, mode='rt', encoding='UTF-8')
+    if compression == 'zst':
+        if zstandard is None:
+            raise ImportError('zstandard is required to read .zst files')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(filename, mode='rb'),
+                                                            closefd=True)
+        return io.TextIOWrapper(reader, encoding='UTF-8')
+    return open(filename, mode='r', encoding='UTF-8')
+
+
+def iter_csv_file(filename: str):
+    '''
+    Generator version of read_csv_file: opens the file and yields
+    one dictionary per line, without keeping the whole file in memory.
+    Compressed files are read through open_text.
+
+    errors:
+    FileNotFoundError
+    '''
+    with open_text(filename) as file:
+        yield from csv.DictReader(file)
 
 
 def read_csv_file(filename: str) -> list:
@@ -20,29 +119,132 @@ def read_csv_file(filename: str) -> list:
     right data format - list of dictionaries
     '''
     try:
-        with (open(filename, mode='r', encoding='UTF-8') as file):
-            # Check on correct file extension.
-            if not filename.endswith('.csv'):
-                return ['File is not csv']
-            csv_reader = csv.DictReader(file)
-            result = [lines for lines in csv_reader]
-
-            # Check on correctness.
-            if not isinstance(result, list) or not all(isinstance(item, dict)
-                                                       for item in result):
-                return ['Invalid data format: expected list of dictionaries']
-
-            return result
+        # Check on correct file extension.
+        if data_format(filename) != 'csv':
+            return ['File is not csv']
+        result = [lines for lines in iter_csv_file(filename)]
+
+        # Check on correctness.
+        if not isinstance(result, list) or not all(isinstance(item, dict)
+                                                   for item in result):
+            return ['Invalid data format: expected list of dictionaries']
+
+        return result
     # In case incorrect name.
     except FileNotFoundError:
         return ['File is not found']
     
+def iter_json_file(filename: str, chunk_size: int = 65536):
+    '''
+    Incremental parser for a file with a top-level JSON array.
+
+    The file is read in chunks and every element of the array is decoded
+    and yielded as soon as it is complete, so only one transaction
+    is kept in memory at a time.
+
+    errors:
+    FileNotFoundError
+    json.JSONDecodeError - broken JSON
+    ValueError - the document is not a list of dictionaries
+    '''
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\n\r\ufeff'
+
+    with open_text(filename) as file:
+        buffer = ''
+        position = 0
+        eof = False
+
+        def next_char():
+            # Skips whitespace and reads more data when the buffer ends.
+            # Returns the next significant character or '' at the end of file.
+            nonlocal buffer, position, eof
+            while True:
+                while position < len(buffer) and buffer[position] in whitespace:
+                    position += 1
+                if position < len(buffer) or eof:
+                    return buffer[position:position + 1]
+                chunk = file.read(chunk_size)
+                buffer, position = buffer[position:] + chunk, 0
+                eof = chunk == ''
+
+        if next_char() != '[':
+            raise ValueError('Invalid data format: expected list of dictionaries')
+        position += 1
+
+        if next_char() == ']':
+            return
+
+        while True:
+            next_char()
+            # Decode one element, reading more data while it is incomplete.
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    if end < len(buffer) or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                chunk = file.read(chunk_size)
+                buffer, position = buffer[position:] + chunk, 0
+                eof = chunk == ''
+
+            if not isinstance(item, dict):
+                raise ValueError('Invalid data format: expected list of dictionaries')
+            yield item
+            position = end
+
+            separator = next_char()
+            position += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter",
+                                           buffer, position - 1)
+
+
+def parse_json_line(line: str):
+    '''
+    Returns the dictionary of one JSON Lines line, None for a blank line.
+    A byte order mark (the start of a file saved with one) is skipped.
+
+    errors:
+    json.JSONDecodeError - broken line
+    ValueError - the line is not a dictionary
+    '''
+    line = line.strip().lstrip('\ufeff')
+    if not line:
+        return None
+    item = json.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError('Invalid data format: expected dictionary on every line')
+    return item
+
+
+def iter_json_lines_file(filename: str):
+    '''
+    Reads a JSON Lines (.jsonl / .ndjson) file: one JSON object per line.
+    Yields dictionaries one at a time, blank lines are skipped.
+
+    errors:
+    FileNotFoundError
+    json.JSONDecodeError - broken line
+    ValueError - a line is not a dictionary
+    '''
+    with open_text(filename) as file:
+        for line in file:
+            item = parse_json_line(line)
+            if item is not None:
+                yield item
+
+
 def read_json_file(filename: str) -> list:
     '''
     Function:
     1. Imports the json module
     2. Reads a file
-    3. Use json.load() to convert
+    3. Uses iter_json_file() to decode it element by element
     4. Returns a list of dictionaries
 
     errors:
@@ -54,27 +256,29 @@ def read_json_file(filename: str) -> list:
     '''
     try:
         # Check file extension
-        if not filename.endswith('.json'):
+        if data_format(filename) != 'json':
             return ['File is not json']
-        
-        with open(filename, mode='r', encoding='UTF-8') as file:
-            # Load JSON data directly
-            result = json.load(file)
-            
-            # Validate that data is list of dictionaries
-            if not isinstance(result, list) or not all(isinstance(item, dict) for item in result):
-                return ['Invalid data format: expected list of dictionaries']
-            
-            return result
-    # In case incorrect name. 
+
+        # Elements are validated while decoding
+        return [item for item in iter_json_file(filename)]
+    # Broken JSON is reported as before.
+    except json.JSONDecodeError:
+        raise
+    # Data is not a list of dictionaries.
+    except ValueError as error:
+        return [str(error)]
+    # In case incorrect name.
     except FileNotFoundError:
         return ['File not found']
 
 
-def import_financial_data(filename: str) -> list:
+def import_financial_data(filename: str, compact: bool = False,
+                          accounts: bool = False, duplicates=None) -> list:
     '''
     Function:
-    1. Determine the file type by extension (.csv or .json)
+    1. Determine the file type by extension (.csv, .json, .jsonl or .ndjson),
+       files compressed with gzip, bzip2, xz or zstd are read as a stream
+       ('data.csv.gz', 'data.json.zst')
     2. Call the appropriate read function
     3. Check that the data has the correct structure
     4. Return a list of transactions in a list of lists format
@@ -95,15 +299,37 @@ def import_financial_data(filename: str) -> list:
 
     exit data example (lang='ru'):
     ['2024-01-18', -780.9, 'Продукты в Магните', 'расход']
+
+    With compact=True transactions are returned as a TransactionList
+    of compact records (amounts in kopecks, strings interned).
+
+    With accounts=True every transaction gets a fifth field, the account
+    (see ACCOUNT_FIELDS): ['2024-01-18', -780.9, 'Продукты в Магните', 'расход', '42']
+    Compact records do not keep accounts.
+
+    With a dedupe.DuplicateFilter as duplicates, repeated transactions
+    are dropped while reading and counted in the filter.
     '''
 
-    if filename.split(sep='.')[-1] == 'json':
-        read_data = read_json_file(filename)
-    elif filename.split(sep='.')[-1] == 'csv':
-        read_data = read_csv_file(filename)
-    else:
+    if data_format(filename) not in SUPPORTED_FORMATS:
         return ['unknown data format']
+    if compact and accounts:
+        return ['compact records do not keep accounts']
+
+    # Use tqdm for printing status bar.
+    if compact:
+        return records.TransactionList.pack(
+            tqdm.tqdm(iter_financial_data(filename, duplicates=duplicates)))
+    return [transaction for transaction
+            in tqdm.tqdm(iter_financial_data(filename, accounts, duplicates))]
 
+
+def find_keys(dictionary: dict) -> tuple:
+    '''
+    Finds the keys of the date, amount, description and type fields
+    in the first record of the file. Key of type is '' if the dataset
+    has no type field.
+    '''
     # Create empty variables for keys.
     k_amount = ''
     k_date = ''
@@ -112,7 +338,7 @@ def import_financial_data(filename: str) -> list:
 
     # We run through the first element of the dictionary,
     # finding the keys we need.
-    for need_keys in read_data[0].keys():
+    for need_keys in dictionary.keys():
         if 'amount' in need_keys:
             k_amount = need_keys
         if 'date' in need_keys:
@@ -122,28 +348,75 @@ def import_financial_data(filename: str) -> list:
         if 'type' in need_keys:
             k_type = need_keys
 
+    return k_date, k_amount, k_description, k_type
+
+
+def find_account_key(dictionary: dict) -> str:
+    '''
+    Finds the key of the account field in the first record of the file.
+    Returns '' if the dataset has no account field.
+    '''
+    for key in dictionary.keys():
+        if key.strip().lower() in ACCOUNT_FIELDS:
+            return key
+    return ''
+
+
+def convert_record(dictionary: dict, keys: tuple, account_key: str = None) -> list:
+    '''
+    Converts one record of the file to a transaction
+    [date, amount, description, type].
+    If the dataset has no type field, it is taken from the amount sign.
+    If account_key is given (see find_account_key), the account is added:
+    [date, amount, description, type, account].
+    '''
+    k_date, k_amount, k_description, k_type = keys
+    inter_list = [dictionary[k_date], float(dictionary[k_amount]),
+                  dictionary[k_description]]
+
     if k_type != '':
-        # Loop for generating lists of lists.
-        exit_list = []
-        # Use tqdm for printing status bar.
-        for dictionary in tqdm.tqdm(read_data):
-            inter_list = [dictionary[k_date], float(dictionary[k_amount]),
-                          dictionary[k_description], dictionary[k_type]]
-            exit_list.append(inter_list)
-
-        return exit_list
-
-    # Loop for generating lists of lists.
-    exit_list = []
-    # Use tqdm for printing status bar.
-    for dictionary in tqdm.tqdm(read_data):
-        inter_list = [dictionary[k_date], float(dictionary[k_amount]),
-                      dictionary[k_description]]
-        if str(dictionary[k_amount])[0] == '-':
-            inter_list += ['расход']
-        else:
-            inter_list += ['доход']
-        exit_list.append(inter_list)
-    return exit_list
+        inter_list.append(dictionary[k_type])
+    elif str(dictionary[k_amount])[0] == '-':
+        inter_list.append('расход')
+    else:
+        inter_list.append('доход')
+
+    if account_key is not None:
+        inter_list.append(str(dictionary[account_key]) if account_key else DEFAULT_ACCOUNT)
+    return inter_list
+
+
+def iter_financial_data(filename: str, accounts: bool = False, duplicates=None):
+    '''
+    Streaming version of import_financial_data.
+
+    Records are read, checked and converted lazily, one at a time,
+    so memory does not depend on the size of the file.
+    With accounts=True the account is the fifth field of every transaction.
+    With a dedupe.DuplicateFilter as duplicates, transactions it finds
+    repeated are skipped, the file is their source.
+
+    errors:
+    ValueError - unknown data format
+    FileNotFoundError
+    '''
+    extension = data_format(filename)
+    if extension == 'json':
+        rows = iter_json_file(filename)
+    elif extension in ('jsonl', 'ndjson'):
+        rows = iter_json_lines_file(filename)
+    elif extension == 'csv':
+        rows = iter_csv_file(filename)
+    else:
+        raise ValueError('unknown data format')
 
+    first = next(rows, None)
+    if first is None:
+        return
+    keys = find_keys(first)
+    account_key = find_account_key(first) if accounts else None
 
+    for dictionary in itertools.chain((first,), rows):
+        transaction = convert_record(dictionary, keys, account_key)
+        if duplicates is None or not duplicates.is_duplicate(transaction, filename):
+            yield transaction
@@ -0,0 +1,181 @@
+import csv
+import hashlib
+import io
+import mmap
+import os
+import pickle
+
+import import_financial_data_ru as fdi
+import catigorize as cat
+import category_cache as cc
+import aggregation as agg
+import parallel as par
+
+
+DEFAULT_STATE_FILE = '.report_state.pickle'
+
+# Version of the saved state, changed when IncrementalReport changes.
+STATE_VERSION = 3
+
+# Bytes hashed at the start and before the end of the processed part,
+# to check that the file was only appended to.
+HEAD_SIZE = 4096
+TAIL_SIZE = 64 * 1024
+
+
+class IncrementalReport:
+    '''
+    Report aggregates of a CSV or JSON Lines file that only grows at the end.
+
+    The accumulator and the byte offset of the processed part are saved
+    between runs. update() reads only the lines added after that offset,
+    so refreshing the report costs time proportional to the new rows.
+    If the file became shorter, or the hashes of the beginning and of the
+    end of the processed part changed, everything is recomputed.
+    With distributions=True the accumulator keeps SpendingSketches too.
+    '''
+
+    def __init__(self, filename: str, distributions: bool = False):
+        self.filename = os.path.abspath(filename)
+        self.distributions = distributions
+        self.keywords = cc.keywords_fingerprint(cat.create_categories())
+        self.reset()
+
+    def reset(self) -> None:
+        '''
+        Forgets everything processed so far.
+        '''
+        self.accumulator = par.new_accumulator(self.distributions)
+        self.file_format, self.header = par.read_header(self.filename)
+        self.offset = 0
+        if self.file_format == 'csv':
+            with open(self.filename, mode='rb') as file:
+                self.offset = len(file.readline())
+        self.start = self.offset
+        self.head_hash = self.tail_hash = ''
+        # The processed part ends with a last row that had no line break.
+        self.open_row = False
+
+    def _hashes(self, data) -> tuple:
+        '''
+        Hashes of the beginning and of the end of the processed part.
+        '''
+        head = hashlib.sha256(data[:min(HEAD_SIZE, self.offset)]).hexdigest()
+        tail = hashlib.sha256(data[max(0, self.offset - TAIL_SIZE):self.offset]).hexdigest()
+        return head, tail
+
+    def is_valid(self) -> bool:
+        '''
+        Checks that the processed part of the file was not changed.
+        '''
+        if self.keywords != cc.keywords_fingerprint(cat.create_categories()):
+            return False
+        if os.path.getsize(self.filename) < self.offset:
+            return False
+        if self.offset == self.start:
+            return True
+        with open(self.filename, mode='rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return self._hashes(data) == (self.head_hash, self.tail_hash)
+
+    def _is_whole_row(self, data, start: int, size: int) -> bool:
+        '''
+        Tells whether the bytes [start, size) after the last line break are
+        a whole row: the file did not grow while it was read and the line
+        parses as a complete record.
+        '''
+        if os.path.getsize(self.filename) != size:
+            return False
+        try:
+            line = data[start:size].decode('UTF-8').strip()
+        except UnicodeDecodeError:
+            return False
+        if not line:
+            return False
+
+        if self.file_format == 'csv':
+            rows = list(csv.reader(io.StringIO(line, newline='')))
+            return len(rows) == 1 and len(rows[0]) == len(self.header)
+        try:
+            return fdi.parse_json_line(line) is not None
+        except ValueError:
+            return False
+
+    def update(self) -> int:
+        '''
+        Adds the complete lines appended since the last update
+        and returns the number of new transactions.
+        '''
+        if not self.is_valid():
+            self.reset()
+
+        size = os.path.getsize(self.filename)
+        if size == self.offset:
+            return 0
+
+        if self.open_row:
+            # The last row was counted without a line break. If the file does
+            # not go on with one, the row was still being written: start again.
+            with open(self.filename, mode='rb') as file:
+                file.seek(self.offset)
+                if file.read(1) not in (b'\n', b'\r'):
+                    self.reset()
+            self.open_row = False
+
+        with open(self.filename, mode='rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # A last line without a line break may still be being written,
+            # it is taken only if it is already a whole row.
+            end = max(data.rfind(b'\n', self.offset, size) + 1, self.offset)
+            if end < size and self._is_whole_row(data, end, size):
+                end = size
+                self.open_row = True
+            if end <= self.offset:
+                return 0
+
+            new_part = par.process_range(self.filename, self.offset, end,
+                                         self.file_format, self.header, self.distributions)
+            self.accumulator.merge(new_part)
+            self.offset = end
+            self.head_hash, self.tail_hash = self._hashes(data)
+
+        return new_part.quantity
+
+    def save(self, state_file: str = DEFAULT_STATE_FILE) -> None:
+        '''
+        Writes the state to a file.
+        '''
+        with open(state_file, mode='wb') as file:
+            pickle.dump((STATE_VERSION, self), file)
+
+    @classmethod
+    def load(cls, filename: str, state_file: str = DEFAULT_STATE_FILE,
+             distributions: bool = False) -> 'IncrementalReport':
+        '''
+        Reads the state saved for the data file.
+        Returns a new empty state if there is none, or if distributions
+        are needed and the saved state has no sketches.
+        '''
+        try:
+            with open(state_file, mode='rb') as file:
+                version, state = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return cls(filename, distributions)
+
+        if (version != STATE_VERSION or state.filename != os.path.abspath(filename)
+                or (distributions and not state.distributions)):
+            return cls(filename, distributions)
+        return state
+
+
+def update_report(filename: str, state_file: str = DEFAULT_STATE_FILE,
+                  distributions: bool = False) -> agg.ReportAccumulator:
+    '''
+    Loads the saved state, adds the new rows of the file, saves the state
+    and returns the accumulator with the whole history (with its sketches
+    if distributions is True).
+    '''
+    state = IncrementalReport.load(filename, state_file, distributions)
+    state.update()
+    state.save(state_file)
+    return state.accumulator
@@ -0,0 +1,284 @@
+import argparse
+import bisect
+import calendar
+import contextlib
+import io
+import json
+import sys
+from datetime import date as date_type, datetime
+from functools import lru_cache
+
+import ru_local as ru
+import import_financial_data_ru as fdi
+import catigorize as cat
+import statistic as stat
+
+
+@lru_cache(maxsize=4096)
+def date_key(date: str) -> str:
+    '''
+    Returns the date as 'YYYY-MM-DD', so dates can be compared as strings.
+    '''
+    if (len(date) == 10 and date[4] == '-' and date[7] == '-'
+            and date[:4].isdigit() and date[5:7].isdigit() and date[8:].isdigit()):
+        year, month, day = int(date[:4]), int(date[5:7]), int(date[8:])
+        if 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]:
+            return date
+    return datetime.strptime(date, '%Y-%m-%d').date().isoformat()
+
+
+def month_bounds(period: tuple) -> tuple:
+    '''
+    First and last date keys of the period (year, month), both included.
+    '''
+    year, month = period
+    last_day = calendar.monthrange(year, month)[1]
+    return f'{year:04d}-{month:02d}-01', f'{year:04d}-{month:02d}-{last_day:02d}'
+
+
+class Postings:
+    '''
+    Positions of transactions in the ledger in order of dates,
+    with prefix sums of their amounts: prefix[i] is the sum
+    of the first i amounts in kopecks. Integer sums are exact,
+    so the difference of two of them is exact too.
+    '''
+    __slots__ = ('dates', 'positions', 'prefix')
+
+    def __init__(self):
+        self.dates = []
+        self.positions = []
+        self.prefix = [0]
+
+    def add(self, date: str, position: int, amount: float) -> None:
+        self.dates.append(date)
+        self.positions.append(position)
+        self.prefix.append(self.prefix[-1] + round(amount * 100))
+
+    def span(self, start: str = None, end: str = None) -> tuple:
+        '''
+        Slice of the postings between start and end (both included).
+        '''
+        low = 0 if start is None else bisect.bisect_left(self.dates, start)
+        high = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return low, max(low, high)
+
+    def query(self, start: str = None, end: str = None) -> tuple:
+        '''
+        (total, count) of the amounts between start and end.
+        '''
+        low, high = self.span(start, end)
+        if low == high:
+            return 0, 0
+        return (self.prefix[high] - self.prefix[low]) / 100, high - low
+
+
+class Ledger(stat.StatisticsMixin):
+    '''
+    Index of categorized transactions for date-range and category queries.
+
+    Transactions are sorted by date. Every (type, category) pair,
+    every type, every category and the whole ledger have a posting
+    list with prefix sums, so the total, count and average of any
+    date range are found with two binary searches.
+
+    The order of first appearance of months and categories in the data
+    is kept, so the statistics functions give dictionaries in the same
+    order as the list functions. Sums are exact to the kopeck, so they can
+    differ from a sequential sum of floats in the last digit.
+    '''
+
+    def __init__(self, transactions):
+        '''
+        Builds the index from any iterable of
+        [date, amount, description, type, category].
+        '''
+        rows = []
+        # Orders of first appearance: {key : None, ...}
+        self.months = {}
+        self.expense_categories = {}
+        self.month_categories = {}
+        self.month_expense_categories = {}
+        self.types = {}
+
+        for transaction in transactions:
+            day = date_key(transaction[0])
+            period = (int(day[:4]), int(day[5:7]))
+            transaction_type = transaction[3]
+            category = transaction[4]
+
+            self.types.setdefault(transaction_type)
+            if period not in self.months:
+                self.months[period] = None
+                self.month_categories[period] = {}
+                self.month_expense_categories[period] = {}
+            self.month_categories[period].setdefault(category)
+            if transaction_type != ru.INCOME:
+                self.expense_categories.setdefault(category)
+            # Historical analysis counts only transactions of type "расход".
+            if transaction_type == ru.EXPENSE:
+                self.month_expense_categories[period].setdefault(category)
+
+            rows.append((day, transaction))
+
+        # Sorting is stable: transactions of one day keep the order of the data.
+        rows.sort(key=lambda row: row[0])
+        self.transactions = [transaction for _, transaction in rows]
+
+        self.postings = {}
+        for position, (day, transaction) in enumerate(rows):
+            amount = transaction[1]
+            transaction_type = transaction[3]
+            category = transaction[4]
+            for key in ((None, None), (transaction_type, None),
+                        (None, category), (transaction_type, category)):
+                postings = self.postings.get(key)
+                if postings is None:
+                    postings = self.postings[key] = Postings()
+                postings.add(day, position, amount)
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __iter__(self):
+        '''
+        Yields transactions in order of dates.
+        '''
+        return iter(self.transactions)
+
+    @staticmethod
+    def _bounds(start, end) -> tuple:
+        if isinstance(start, date_type):
+            start = start.isoformat()
+        if isinstance(end, date_type):
+            end = end.isoformat()
+        return (None if start is None else date_key(start),
+                None if end is None else date_key(end))
+
+    def query(self, start=None, end=None, category: str = None,
+              transaction_type: str = None) -> tuple:
+        '''
+        (total, count) of transactions between the dates start and end
+        (both included, None means no limit), optionally of one category
+        and one type.
+        '''
+        postings = self.postings.get((transaction_type, category))
+        if postings is None:
+            return 0, 0
+        return postings.query(*self._bounds(start, end))
+
+    def total(self, start=None, end=None, category: str = None,
+              transaction_type: str = None) -> float:
+        return self.query(start, end, category, transaction_type)[0]
+
+    def count(self, start=None, end=None, category: str = None,
+              transaction_type: str = None) -> int:
+        return self.query(start, end, category, transaction_type)[1]
+
+    def average(self, start=None, end=None, category: str = None,
+                transaction_type: str = None) -> float:
+        total, count = self.query(start, end, category, transaction_type)
+        return total / count if count else 0
+
+    def expenses(self, start=None, end=None, category: str = None) -> tuple:
+        '''
+        (total, count) of all transactions that are not income,
+        as statistic.py counts expenses.
+        '''
+        total, count = 0, 0
+        for transaction_type in self.types:
+            if transaction_type != ru.INCOME:
+                type_total, type_count = self.query(start, end, category, transaction_type)
+                total += type_total
+                count += type_count
+        return total, count
+
+    def select(self, start=None, end=None, category: str = None,
+               transaction_type: str = None) -> list:
+        '''
+        Transactions between start and end in order of dates (drill-down).
+        '''
+        postings = self.postings.get((transaction_type, category))
+        if postings is None:
+            return []
+        low, high = postings.span(*self._bounds(start, end))
+        return [self.transactions[position] for position in postings.positions[low:high]]
+
+
+def calculate_basic_stats(ledger: Ledger) -> dict:
+    '''
+    Same result as statistic.calculate_basic_stats.
+    '''
+    total_income = ledger.total(transaction_type=ru.INCOME)
+    total_expenses = ledger.expenses()[0]
+    return {ru.INCOME: total_income,
+            ru.EXPENSE: total_expenses,
+            ru.BALANCE: total_income - total_expenses,
+            ru.TRANSACTIONS_QUANTITY: len(ledger)}
+
+
+def calculate_by_category(ledger: Ledger) -> dict:
+    '''
+    Same result as statistic.calculate_by_category.
+    '''
+    total_expenses = ledger.expenses()[0]
+    category_info = {}
+    for category in ledger.expense_categories:
+        total_sum, quantity = ledger.expenses(category=category)
+        percent = round(total_sum / total_expenses * 100, 2)
+        category_info[category] = [total_sum, quantity, percent]
+    return category_info
+
+
+def analyze_by_time(ledger: Ledger) -> dict:
+    '''
+    Same result as statistic.analyze_by_time.
+    '''
+    month_info = {}
+    for period in ledger.months:
+        start, end = month_bounds(period)
+        quantity_category = {category: ledger.count(start, end, category)
+                             for category in ledger.month_categories[period]}
+        n = max(quantity_category.values())
+
+        month_info[period] = {
+            ru.INCOME: ledger.total(start, end, transaction_type=ru.INCOME),
+            ru.EXPENSE: ledger.expenses(start, end)[0],
+            ru.POPULAR_CATEGORIES: [category for category in quantity_category
+                                    if quantity_category[category] == n]}
+    return month_info
+
+
+def expenses_by_month(ledger: Ledger) -> dict:
+    '''
+    Expenses of type "расход" by month and category, the input
+    of planing.summarize_months_data.
+    '''
+    months_data = {}
+    for period in ledger.months:
+        start, end = month_bounds(period)
+        months_data[period] = {category: ledger.total(start, end, category, ru.EXPENSE)
+                               for category in ledger.month_expense_categories[period]}
+    return months_data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Total, count and average of transactions in a date range.')
+    parser.add_argument('filename')
+    parser.add_argument('--start', default=None, help='first date, YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='last date, YYYY-MM-DD')
+    parser.add_argument('--category', default=None)
+    parser.add_argument('--type', default=None, help=f'{ru.INCOME} or {ru.EXPENSE}')
+    parser.add_argument('--list', action='store_true',
+                        help='also print the matching transactions')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        ledger = Ledger(cat.iter_categorized_transactions(fdi.iter_financial_data(args.filename)))
+
+    total, count = ledger.query(args.start, args.end, args.category, args.type)
+    answer = {'total': total, 'count': count, 'average': total / count if count else 0}
+    if args.list:
+        answer['transactions'] = ledger.select(args.start, args.end, args.category, args.type)
+    sys.stdout.write(json.dumps(answer, ensure_ascii=False, indent=2) + '\n')
@@ -1,8 +1,24 @@
+import argparse
+import contextlib
+import sys
 import ru_local as ru
 import import_financial_data_ru as fdi
 import catigorize as cat
 import statistic as stat
 import planing as plan
+import columnar as col
+import database as db
+import records
+import aggregation as agg
+import parallel as par
+import snapshot as snap
+import incremental as inc
+import profiling as prof
+import category_cache as cc
+import report_render as render
+import sketches as sk
+import forecast as fc
+import dedupe
 
 
 def print_report(stats: list,
@@ -13,78 +29,183 @@ def print_report(stats: list,
                  ) -> None:
     '''
     Beautiful design and print of analyzed data.
+    The report is assembled by report_render and written at once.
     '''
+    sys.stdout.write(render.render_console(stats, category_stats, time_stats,
+                                           analysis, budget))
 
-    print(ru.PR_FINANCIAL_REPORT, end= '\n\n')
-
-    print(ru.PR_KEY_INDICATORS,
-          f'{ru.PR_INCOME} {stats[ru.INCOME]} {ru.PR_RUB}',
-          f'{ru.PR_EXPENSE}: {stats[ru.EXPENSE]} {ru.PR_RUB}',
-          f'{ru.PR_BALANCE} {stats[ru.BALANCE]} {ru.PR_RUB}',
-          f'{ru.PR_NUM_TRANS} {stats[ru.TRANSACTIONS_QUANTITY]}',
-          sep='\n', end= '\n\n')
-
-    print(ru.PR_CATEGORY_EXPENSES)
-    for category in category_stats:
-      print(f'{ru.PR_CATEGORY} {category}')
-      print(f'{ru.PR_EXPENSES}: {category_stats[category][0]}',
-            f'{ru.PR_TRANSACTION_COUNT}: {category_stats[category][1]}',
-            f'{ru.PR_PERCENT_OF_TOTAL}: {category_stats[category][2]} %',
-            sep=', ', end= '\n\n')
-
-    print(ru.PR_MONTHLY_EXPENSES)
-    for month in time_stats:
-      print(f'{ru.PR_MONTH} {ru.month_ru[month]}')
-      print(f'{ru.PR_INCOMES}: {time_stats[month][ru.INCOME]}',
-            f'{ru.PR_EXPENSES}: {time_stats[month][ru.EXPENSE]}',
-            f'{ru.PR_POPULAR_CATEGORIES}: ', end= '')
-      for category in time_stats[month][ru.POPULAR_CATEGORIES]:
-          print(category, end= ' ')
-      print('\n')
-
-    print(ru.PR_HISTORICAL_ANALYSIS)
-    print(f'{ru.PR_AVERAGE_COSTS}:')
-    for category in analysis['average costs']:
-      value = analysis['average costs'][category]
-      print(f'{category} : {value}')
-    print()
-        
-    print(f'{ru.PR_SEASONAL_PATTERNS}:')
-    print(f'{ru.PR_SEASON_PAT_HIGH_COSTS} {analysis['seasonal patterns'][0][0]}',
-          f'{ru.PR_SEASON_PAT_EQUAL} {analysis['seasonal patterns'][0][1]} {ru.PR_RUB}')
-    print(f'{ru.PR_SEASON_PAT_SMALL_COSTS} {analysis['seasonal patterns'][1][0]}',
-          f'{ru.PR_SEASON_PAT_EQUAL} {analysis['seasonal patterns'][1][1]} {ru.PR_RUB}',
-          end= '\n\n')
-    
-    print(f'{ru.PR_BIGGEST_EXPENSES}:')
-    for category in analysis['biggest expenses']:
-      value = analysis['biggest expenses'][category]
-      print(f'{category} : {value}')
-    print()
-
-    print(f'{ru.PR_RECOMMENDATIONS}:')
-    print(f'{ru.PR_RECOMMEND_PLAN} {analysis['recommendations'][0]} ' \
-          f'{ru.PR_BY} {analysis['recommendations'][1]}%',
-          end= '\n\n')
-
-    print(ru.PR_BUDGET,
-          ru.PR_BUDGET_DISTRIBUTION,
-          ru.PR_BUDGET_ESSENTIALS,
-          ru.PR_BUDGET_LIFESTYLE,
-          ru.PR_BUDGET_SAVINGS,
-          sep='\n')
-
-    if budget[0]:
-      print(ru.PR_BUDGET_SUCCESS)
-    else:
-      print(ru.PR_BUDGET_FAILURE)
-      print(f'{ru.PR_BUDGET_CATEGORY_1} {budget[1]}',
-            f'{ru.PR_BUDGET_CATEGORY_2} {budget[2]}',
-            f'{ru.PR_BUDGET_CATEGORY_3} {budget[3]}',
-            sep= '\n')
+
+def analyze_file(filename: str,
+                 cache=None,
+                 stream: bool = False,
+                 use_columnar: bool = False,
+                 workers: int = 0,
+                 use_snapshot: bool = False,
+                 state_file: str = '',
+                 database_file: str = '',
+                 compact: bool = False,
+                 sketches: sk.SpendingSketches = None,
+                 duplicates: dedupe.DuplicateFilter = None,
+                 merge_files: list = ()
+                 ) -> tuple:
+    '''
+    Imports, categorizes and analyzes one file (roles 1-3 and the
+    historical analysis of role 4).
+
+    Statistics and planning data are collected by ReportAccumulator
+    in one pass over the transactions.
+    With stream=True the file is parsed and categorized lazily during
+    this pass instead of being loaded into lists, so memory stays flat.
+    With use_columnar=True the statistics are computed on numpy columns.
+    With workers > 0 a large csv / jsonl file is split into byte ranges
+    that are parsed, categorized and aggregated on a process pool.
+    With use_snapshot=True categorized transactions are memory-mapped
+    from a binary snapshot written on the first run for the same file.
+    With state_file the aggregates are kept in this file between runs
+    and only the rows appended to a csv / jsonl file since then are read.
+    With database_file the transactions are streamed into this SQLite
+    database and the statistics run as GROUP BY queries, so files larger
+    than memory are reported.
+    With compact=True the file is loaded as compact records (amounts in
+    kopecks, strings interned) and the statistics add up exact kopecks.
+    SpendingSketches, if given, are filled with the categorized transactions;
+    with state_file and workers they are built by the workers and merged.
+    A DuplicateFilter, if given, drops repeated transactions while the file
+    and then merge_files (statements that overlap it) are imported, each
+    file is a source of the filter; it cannot be used with use_snapshot,
+    state_file and workers, which do not import the file row by row here.
+
+    Returns: (stats, category_stats, time_stats, analysis)
+    '''
+    if duplicates is not None and (use_snapshot or state_file or (workers and not use_columnar)):
+        raise ValueError('duplicates cannot be dropped with use_snapshot, state_file or workers')
+    if merge_files and duplicates is None:
+        raise ValueError('merge_files need duplicates to drop the overlap')
+
+    with prof.stage('roles 1-3') as stage, contextlib.ExitStack() as resources:
+        if state_file:
+            # Only the rows appended since the last run are processed.
+            report = inc.update_report(filename, state_file, sketches is not None)
+        elif workers and not use_columnar:
+            # Roles 1-3 run on a process pool over byte ranges of the file.
+            report = par.parallel_report(filename, workers, sketches is not None)
+        else:
+            if use_snapshot:
+                # Roles 1 and 2 are skipped if the file has a valid snapshot.
+                categorized_transactions = snap.load_or_import(filename, cache)
+                if isinstance(categorized_transactions, snap.Snapshot):
+                    # The memory map is released when the statistics are done.
+                    resources.enter_context(categorized_transactions)
+                if sketches is not None:
+                    sketches.add_all(categorized_transactions)
+            elif stream or database_file:
+                # Roles 1 and 2 run lazily, row by row, inside the aggregation pass.
+                categorized_transactions = cat.iter_categorized_transactions(
+                    dedupe.iter_merged_data([filename, *merge_files], duplicates),
+                    cache, sketches)
+            else:
+                # 1. Role 1: Importing data.
+                with prof.stage('role 1') as role:
+                    if merge_files:
+                        merged = dedupe.iter_merged_data([filename, *merge_files], duplicates)
+                        transactions = (records.TransactionList.pack(merged) if compact
+                                        else list(merged))
+                    else:
+                        transactions = fdi.import_financial_data(filename, compact,
+                                                                 duplicates=duplicates)
+                    role['rows'] = len(transactions)
+
+                # 2. Role 2: Classify transactions.
+                with prof.stage('role 2') as role:
+                    categorized_transactions = cat.categorize_all_transactions(
+                        transactions, cache, sketches)
+                    role['rows'] = len(categorized_transactions)
+
+            # 3. Role 3: Analyzing statistics.
+            with prof.stage('role 3') as role:
+                if use_columnar:
+                    # Transactions are packed into numpy columns once,
+                    # statistics are then computed with vectorized operations.
+                    columns = col.TransactionColumns(categorized_transactions)
+                    role['rows'] = len(columns)
+                    stage['rows'] = len(columns)
+                    return (stat.calculate_basic_stats(columns),
+                            stat.calculate_by_category(columns),
+                            stat.analyze_by_time(columns),
+                            plan.analyze_historical_spending(columns))
+
+                if database_file:
+                    # Transactions are written in batches, statistics are
+                    # aggregated by SQLite instead of Python loops.
+                    store = db.TransactionDatabase(database_file)
+                    try:
+                        store.clear()
+                        store.add_all(categorized_transactions)
+                        role['rows'] = stage['rows'] = len(store)
+                        return (stat.calculate_basic_stats(store),
+                                stat.calculate_by_category(store),
+                                stat.analyze_by_time(store),
+                                plan.analyze_historical_spending(store))
+                    finally:
+                        store.close()
+
+                if isinstance(categorized_transactions, records.TransactionList):
+                    # Sums of kopecks are exact, they are computed on the records.
+                    role['rows'] = stage['rows'] = len(categorized_transactions)
+                    return (stat.calculate_basic_stats(categorized_transactions),
+                            stat.calculate_by_category(categorized_transactions),
+                            stat.analyze_by_time(categorized_transactions),
+                            plan.analyze_historical_spending(categorized_transactions))
+
+                # One pass fills all accumulators, every section is derived from them.
+                report = agg.ReportAccumulator().add_all(categorized_transactions)
+                role['rows'] = report.quantity
+
+        stage['rows'] = report.quantity
+        if sketches is not None and report.sketches is not None:
+            sketches.merge(report.sketches)
+        return (report.basic_stats(),
+                report.by_category(),
+                report.by_time(),
+                report.historical())
 
 
-def main():
+def build_report(filename: str, cache=None, distributions: bool = False,
+                 forecast_method: str = '', **options) -> tuple:
+    '''
+    Runs all 4 roles for one file without any input or output.
+    options are the modes of analyze_file().
+    With distributions=True the analysis gets the sections of
+    SpendingSketches: the largest expenses and the median and p95
+    of expenses by category and by month.
+    With a forecast_method (see forecast.METHODS) the analysis gets the
+    'forecast' of the next month and the budget is planned for that month.
+
+    Returns the arguments of print_report():
+    (stats, category_stats, time_stats, analysis, report_budget)
+    '''
+    sketches = sk.SpendingSketches() if distributions else None
+    stats, category_stats, time_stats, analysis = analyze_file(
+        filename, cache, sketches=sketches, **options)
+    if sketches is not None:
+        analysis.update(sketches.sections())
+
+    # 4. Role 4: Budget planning.
+    with prof.stage('role 4'):
+        forecast = None
+        if forecast_method:
+            forecast = analysis['forecast'] = fc.forecast_spending(analysis, forecast_method)
+        budget = plan.create_budget_template(time_stats, analysis, forecast)
+        report_budget = plan.compare_budget_vs_actual(budget)
+
+    return stats, category_stats, time_stats, analysis, report_budget
+
+
+def main(stream: bool = False, use_columnar: bool = False, workers: int = 0,
+         use_snapshot: bool = False, state_file: str = '', database_file: str = '',
+         compact: bool = False, distributions: bool = False, forecast_method: str = '',
+         merge_files: list = (), duplicate_tolerance: float = 0,
+         profile: bool = False, output_format: str = 'console'):
     '''
     The main function of the program is the accounting of income, expenses, analysis and budget planning.
 
@@ -109,27 +230,98 @@ def main():
     - compare_budget_vs_actual(): determination of user satisfaction in the budget and return of data on penalties to the budget.
 
     - print_report(): beautiful design and return of analyzed data.
+
+    The roles are run by build_report(), the arguments select the mode
+    of analyze_file().
+    output_format is one of report_render.RENDERERS: console, json, csv, html.
+    merge_files are statements that overlap the file (the same account
+    exported twice, or for overlapping periods). They are merged with it,
+    and transactions already read from another file (amounts within
+    duplicate_tolerance) are dropped and reported to stderr. Equal
+    transactions of one file are kept, they are separate purchases.
+    Hits and misses of the category cache are written to stderr.
+    With profile=True (or the FINANCE_PROFILE environment variable) time,
+    rows per second and peak memory of every role and public function
+    are written as JSON to stderr after the report.
+    With an output_format other than console the file name prompt goes
+    to stderr too, so stdout is one report document.
     '''
 
-    # 1. Role 1: Importing data.
-    transactions = fdi.import_financial_data(input(ru.PR_REQUEST))
+    profiler = None
+    if profile or prof.is_requested():
+        profiler = prof.Profiler()
+        profiler.install()
 
-    # 2. Role 2: Classify transactions.
-    categorized_transactions = cat.categorize_all_transactions(transactions)
+    if output_format == 'console':
+        filename = input(ru.PR_REQUEST)
+    else:
+        # stdout holds only the machine-readable report.
+        sys.stderr.write(ru.PR_REQUEST)
+        sys.stderr.flush()
+        filename = input()
+    cache = cc.CategoryCache.load(cc.DEFAULT_CACHE_FILE, cat.create_categories())
+    # Every file is a source, only the overlap between files is dropped.
+    duplicates = dedupe.DuplicateFilter(duplicate_tolerance) if merge_files else None
 
-    # 3. Role 3: Analyzing statistics.
-    stats = stat.calculate_basic_stats(categorized_transactions)
-    category_stats = stat.calculate_by_category(categorized_transactions)
-    time_stats = stat.analyze_by_time(categorized_transactions)
+    report_data = build_report(
+        filename, cache, stream=stream, use_columnar=use_columnar, workers=workers,
+        use_snapshot=use_snapshot, state_file=state_file, database_file=database_file,
+        compact=compact, distributions=distributions, forecast_method=forecast_method,
+        duplicates=duplicates, merge_files=merge_files)
 
-    # 4. Role 4: Budget planning.
-    analysis = plan.analyze_historical_spending(categorized_transactions)
-    budget = plan.create_budget_template(time_stats, analysis)
-    report_budget = plan.compare_budget_vs_actual(budget)
+    cache.save(cc.DEFAULT_CACHE_FILE)
+    # The cache counts are reported with the other diagnostics on stderr.
+    sys.stderr.write(ru.PR_CACHE_STATS.format(**cache.stats()) + '\n')
 
     # We display the results.
-    print_report(stats, category_stats, time_stats, analysis, report_budget)
+    with prof.stage('report'):
+        render.write_report(output_format, report_data)
+
+    if duplicates is not None:
+        sys.stderr.write(f'{ru.PR_DUPLICATES} {duplicates.dropped}\n')
+        for _, transaction in duplicates.dropped_rows:
+            sys.stderr.write(f'{transaction}\n')
+
+    if profiler is not None:
+        profiler.uninstall()
+        profiler.write_summary()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stream', action='store_true',
+                        help='read the file lazily, keeping memory flat')
+    parser.add_argument('--columnar', action='store_true',
+                        help='compute statistics on numpy columns')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='process a csv / jsonl file on this many processes')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='reuse a binary snapshot of an unchanged file')
+    parser.add_argument('--state', default='',
+                        help='keep aggregates in this file and read only appended rows')
+    parser.add_argument('--database', default='',
+                        help='load transactions into this SQLite file and aggregate in SQL')
+    parser.add_argument('--compact', action='store_true',
+                        help='keep transactions as compact records with amounts in kopecks')
+    parser.add_argument('--distributions', action='store_true',
+                        help='add the largest expenses and median / p95 sections')
+    parser.add_argument('--forecast', default='', choices=fc.METHODS,
+                        help='forecast the expenses of the next month and plan its budget')
+    parser.add_argument('--merge', nargs='+', default=[], metavar='FILE',
+                        help='statements overlapping the file: merge them with it, '
+                             'drop the repeated transactions and report them to stderr')
+    parser.add_argument('--dedupe-tolerance', type=float, default=0,
+                        help='amounts that differ by at most this are the same')
+    parser.add_argument('--format', default='console', choices=list(render.RENDERERS),
+                        help='output format of the report')
+    parser.add_argument('--profile', action='store_true',
+                        help='print time and memory of every stage after the report')
+    args = parser.parse_args()
+    if args.merge and (args.snapshot or args.state or (args.workers and not args.columnar)):
+        parser.error('--merge cannot be used with --snapshot, --state or --workers')
+    main(stream=args.stream, use_columnar=args.columnar, workers=args.workers,
+         use_snapshot=args.snapshot, state_file=args.state, database_file=args.database,
+         compact=args.compact, distributions=args.distributions,
+         forecast_method=args.forecast, merge_files=args.merge,
+         duplicate_tolerance=args.dedupe_tolerance, profile=args.profile,
+         output_format=args.format)
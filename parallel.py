@@ -0,0 +1,138 @@
+import csv
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import import_financial_data_ru as fdi
+import catigorize as cat
+import aggregation as agg
+import sketches as sk
+
+
+# Upper bound for one byte range, so a worker never holds much of the file.
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+
+
+def split_file(filename: str, parts: int, skip_header: bool = False) -> list:
+    '''
+    Splits a file into byte ranges [(start, end), ...] that begin
+    and end on line boundaries. The first line is left out
+    if skip_header is True.
+    '''
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+
+    with open(filename, mode='rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        if skip_header:
+            start = data.find(b'\n') + 1 or size
+
+        parts = max(parts, (size - start) // MAX_CHUNK_SIZE + 1)
+        step = max((size - start) // parts, 1)
+
+        ranges = []
+        while start < size:
+            end = data.find(b'\n', min(start + step, size - 1))
+            end = size if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_header(filename: str) -> tuple:
+    '''
+    Returns the file format ('csv' or 'jsonl') and the field names
+    of the first record.
+    '''
+    if fdi.detect_compression(filename):
+        raise ValueError('parallel mode does not support compressed files')
+    extension = filename.split(sep='.')[-1]
+    if extension == 'csv':
+        with open(filename, mode='r', encoding='utf-8-sig') as file:
+            return 'csv', next(csv.reader(file), [])
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl', list(next(fdi.iter_json_lines_file(filename), {}))
+    raise ValueError('parallel mode supports only csv, jsonl and ndjson files')
+
+
+def _iter_records(text: str, file_format: str, header: list):
+    '''
+    Turns the text of one byte range into dictionaries.
+    '''
+    if file_format == 'csv':
+        for row in csv.reader(io.StringIO(text, newline='')):
+            if row:
+                yield dict(zip(header, row))
+    else:
+        for line in text.split('\n'):
+            record = fdi.parse_json_line(line)
+            if record is not None:
+                yield record
+
+
+def iter_range(filename: str, start: int, end: int, file_format: str,
+               header: list, accounts: bool = False):
+    '''
+    Yields the transactions of the lines in bytes [start, end) of the file,
+    with the account as the fifth field if accounts is True.
+    '''
+    with open(filename, mode='rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode('UTF-8')
+
+    fields = dict.fromkeys(header)
+    keys = fdi.find_keys(fields)
+    account_key = fdi.find_account_key(fields) if accounts else None
+    for record in _iter_records(text, file_format, header):
+        yield fdi.convert_record(record, keys, account_key)
+
+
+def new_accumulator(distributions: bool = False) -> agg.ReportAccumulator:
+    '''
+    Empty accumulator, with SpendingSketches if distributions is True.
+    '''
+    return agg.ReportAccumulator(sk.SpendingSketches() if distributions else None)
+
+
+def process_range(filename: str, start: int, end: int, file_format: str,
+                  header: list, distributions: bool = False) -> agg.ReportAccumulator:
+    '''
+    Worker of the process pool: parses, categorizes and aggregates
+    the lines in bytes [start, end) of the file.
+    With distributions=True the accumulator also fills SpendingSketches.
+    '''
+    transactions = iter_range(filename, start, end, file_format, header)
+    return new_accumulator(distributions).add_all(
+        cat.iter_categorized_transactions(transactions))
+
+
+def parallel_report(filename: str, workers: int = None,
+                    distributions: bool = False) -> agg.ReportAccumulator:
+    '''
+    Map-reduce over a large CSV or JSON Lines file.
+
+    The file is split into line-aligned byte ranges, every range
+    is processed by process_range on a process pool, and the partial
+    accumulators are merged in file order. The result gives the same
+    report as the sequential pass (sums may differ in the last digits
+    because they are added in a different order).
+    With distributions=True the sketches of the ranges are merged
+    into result.sketches.
+
+    CSV fields must not contain line breaks.
+    '''
+    workers = workers or os.cpu_count() or 1
+    file_format, header = read_header(filename)
+    ranges = split_file(filename, workers * 4, skip_header=file_format == 'csv')
+
+    result = new_accumulator(distributions)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_range, filename, start, end,
+                                   file_format, header, distributions)
+                   for start, end in ranges]
+        for future in futures:
+            result.merge(future.result())
+    return result
@@ -1,6 +1,8 @@
+import heapq
+
 import ru_local as ru
-import statistic as stat
 import budget_category
+import statistic as stat
 
 
 def analyze_historical_spending(transactions: list) -> dict:
@@ -8,7 +10,7 @@ def analyze_historical_spending(transactions: list) -> dict:
     Analyzes historical financial transactions and returns spending statistics.
 
     Args:
-        transactions (list): List of transactions where each transaction is a list containing:
+        transactions (iterable): Transactions where each transaction is a list containing:
                             [amount, description, date, type, category]
 
     Returns:
@@ -17,138 +19,83 @@ def analyze_historical_spending(transactions: list) -> dict:
             - 'seasonal patterns': Seasonal spending patterns (highest and lowest spending seasons)
             - 'biggest expenses': Top 3 spending categories
             - 'recommendations': Budget optimization recommendations
-            - 'category data by month': Monthly spending data organized by category
-    '''
-    # Get transaction data by month. Data format:
-    # {month number : [[first transaction], [second transaction], ...], }
-    all_transactions_by_months = stat.sort_by_month(transactions)
+            - 'category data by month': Monthly spending data organized by category,
+                                        keyed by (year, month)
 
-    # Number of analyzed months
-    number_of_months = len(all_transactions_by_months)
+    A store with its own months_data() method (TransactionColumns,
+    TransactionDatabase, Ledger, TransactionList) groups the expenses itself.
+    '''
+    if hasattr(transactions, 'months_data'):
+        return summarize_months_data(transactions.months_data())
 
-    # Process data for each month. Combine transaction data for same categories.
+    # Process data for each month in one pass over the transactions,
+    # so any iterable (for example a stream from a file) is accepted.
+    # Combine transaction data for same categories.
     # Dictionary with data converted to required format looks like:
-    # {month number : {category_1 : expenses, category_2 : expenses, ...}, ...}
+    # {(year, month) : {category_1 : expenses, category_2 : expenses, ...}, ...}
     months_data = {}
-    for month_number in all_transactions_by_months:
-        # Monthly transactions: [[first transaction], [second transaction], ...]
-        month_data = all_transactions_by_months[month_number]
-
-        expenses_month_for_categories = {}
-
-        for transaction in month_data:
-            expense_val = transaction[1]
-            transaction_type = transaction[3]
-            category = transaction[4]
+    for transaction in transactions:
+        month_number = stat.period_key(transaction[0])
+        expense_val = transaction[1]
+        transaction_type = transaction[3]
+        category = transaction[4]
+
+        if month_number in months_data:
+            expenses_month_for_categories = months_data[month_number]
+        else:
+            expenses_month_for_categories = {}
+            months_data[month_number] = expenses_month_for_categories
 
-            if transaction_type == ru.EXPENSE:
-                if category in expenses_month_for_categories:
-                    expenses_month_for_categories[category] += expense_val
-                else:
-                    expenses_month_for_categories[category] = expense_val
+        if transaction_type == ru.EXPENSE:
+            if category in expenses_month_for_categories:
+                expenses_month_for_categories[category] += expense_val
+            else:
+                expenses_month_for_categories[category] = expense_val
 
-        months_data[month_number] = expenses_month_for_categories
+    return summarize_months_data(months_data)
 
-    # Total expenses by categories for all time:
-    # {category_1 : total_expenses, category_2 : total_expenses, ...}
-    total_expenses_in_categories = {}
-    for month in months_data:
-        # Monthly data: {category_1 : expenses, category_2 : expenses, ...}
-        month_data = months_data[month]
 
-        for category in month_data:
-            # Expenses in one category for one month
-            expense_in_category = month_data[category]
+# Season of every month number.
+SEASON_OF_MONTH = {12: ru.WINTER, 1: ru.WINTER, 2: ru.WINTER,
+                   3: ru.SPRING, 4: ru.SPRING, 5: ru.SPRING,
+                   6: ru.SUMMER, 7: ru.SUMMER, 8: ru.SUMMER,
+                   9: ru.AUTUMN, 10: ru.AUTUMN, 11: ru.AUTUMN}
 
-            if category in total_expenses_in_categories:
-                total_expenses_in_categories[category] += expense_in_category
-            else:
-                total_expenses_in_categories[category] = expense_in_category
 
+def _summary(months_data: dict, categories: list, totals: list,
+             season_totals: dict, number_of_months: int) -> dict:
+    '''
+    Builds the dictionary of analyze_historical_spending from the totals
+    per category (categories in order of first appearance) and per season.
+    '''
     # Average monthly expenses by category:
     # {category_1 : average expenses, category_2 : average expenses, ...}
-    average_expenses_by_category = {}
-    for category in total_expenses_in_categories:
-        average_expenses_by_category[category] = \
-            round(total_expenses_in_categories[category] / number_of_months, 2)
+    average_expenses_by_category = {category: round(total / number_of_months, 2)
+                                    for category, total in zip(categories, totals)}
 
-    # Total expenses by categories sorted in descending order:
-    # [(category_1 : expenses), (category_2 : expenses), ...]
-    total_expenses_in_categories_sorted = sorted(total_expenses_in_categories.items(),
-                                                 key=lambda i: i[1],
-                                                 reverse=True)
+    # Categories ranked by total expenses, as far as the recommendation needs:
+    # the 3 biggest ones and the one at a quarter of the sorted list.
+    # nlargest keeps the order of equal totals like a stable sort.
+    quartile = len(categories) // 4
+    ranked = heapq.nlargest(max(3, quartile + 1), range(len(categories)),
+                            key=totals.__getitem__)
 
     # 3 categories with highest expenses:
     # {category_1 : expenses, category_2 : expenses, category_3 : expenses}
-    top_3_category = {}
-    for i in range(3):
-        category = total_expenses_in_categories_sorted[i][0]
-        expense_val = total_expenses_in_categories_sorted[i][1]
-        top_3_category[category] = expense_val
-
-    # Total expenses for each month:
-    # {month_1 : expenses, month_2 : expenses, ...}
-    total_expenses_by_month = {}
-    for month in months_data:
-        month_data = months_data[month]
-        expense_per_month = sum(list(month_data.values()))
-        total_expenses_by_month[month] = expense_per_month
-
-    seasons = {
-        ru.WINTER: [12, 1, 2],
-        ru.SPRING: [3, 4, 5],
-        ru.SUMMER: [6, 7, 8],
-        ru.AUTUMN: [9, 10, 11]
-    }
+    top_3_category = {categories[i]: totals[i] for i in ranked[:3]}
 
-    # Total expenses by seasons:
-    # {Summer : expenses, Spring : expenses, ...}
-    seasonal_data = {}
-    for month in total_expenses_by_month:
-        expense_by_month = total_expenses_by_month[month]
-        if month in seasons[ru.WINTER]:
-            if ru.WINTER in seasonal_data:
-                seasonal_data[ru.WINTER] += expense_by_month
-            else:
-                seasonal_data[ru.WINTER] = expense_by_month
-        elif month in seasons[ru.SPRING]:
-            if ru.SPRING in seasonal_data:
-                seasonal_data[ru.SPRING] += expense_by_month
-            else:
-                seasonal_data[ru.SPRING] = expense_by_month
-        elif month in seasons[ru.SUMMER]:
-            if ru.SUMMER in seasonal_data:
-                seasonal_data[ru.SUMMER] += expense_by_month
-            else:
-                seasonal_data[ru.SUMMER] = expense_by_month
-        else:
-            if ru.AUTUMN in seasonal_data:
-                seasonal_data[ru.AUTUMN] += expense_by_month
-            else:
-                seasonal_data[ru.AUTUMN] = expense_by_month
-
-    # Total expenses by seasons sorted in descending order:
-    # [(Summer : expenses), (Spring : expenses), ...]
-    seasonal_data_sorted = sorted(seasonal_data.items(),
-                                  key= lambda i: i[1],
-                                  reverse= True)
+    # Seasons with highest and lowest expenses, equal totals
+    # keep the order in which the seasons appear in the data.
+    seasonal_data_sorted = sorted(season_totals.items(), key=lambda i: i[1], reverse=True)
+    seasonal_patterns = [seasonal_data_sorted[0], seasonal_data_sorted[-1]]
 
-    # Maximum expenses value, season name with this value
-    max_exp, max_exp_name = seasonal_data_sorted[0][1], seasonal_data_sorted[0][0]
-    # Minimum expenses value, season name with this value
-    min_exp, min_exp_name = seasonal_data_sorted[-1][1], seasonal_data_sorted[-1][0]
-
-    seasonal_patterns = [(max_exp_name, max_exp), (min_exp_name, min_exp)]
-
-    # Category with maximum expenses: (category, expenses)
-    max_exp_category = total_expenses_in_categories_sorted[0]
-    # Category with average expenses: (category, expenses)
-    several_exp_category = total_expenses_in_categories_sorted[len(total_expenses_in_categories_sorted) // 4]
+    # Category with maximum expenses and category with average expenses.
+    max_exp = totals[ranked[0]]
+    several_exp = totals[ranked[quartile]]
     # Recommended expense reduction for category with maximum expenses
-    recommended_decrease = ((max_exp_category[1] - several_exp_category[1]) \
-                            / max_exp_category[1]) * 100
+    recommended_decrease = ((max_exp - several_exp) / max_exp) * 100
 
-    recommendations_for_planning = (max_exp_category[0], round(recommended_decrease, 2))
+    recommendations_for_planning = (categories[ranked[0]], round(recommended_decrease, 2))
 
     return {
         'average costs': average_expenses_by_category,
@@ -159,13 +106,49 @@ def analyze_historical_spending(transactions: list) -> dict:
     }
 
 
-def create_budget_template(time_stats: dict, analysis: dict) -> dict:
+def summarize_months_data(months_data: dict) -> dict:
+    '''
+    Builds the result of analyze_historical_spending from expenses
+    grouped by month and category.
+
+    Totals by category and by season are added up in one pass over
+    months_data, every month in its own order of categories, so the
+    floating point sums are the same as in the loop version.
+
+    Args:
+        months_data (dict): {(year, month) : {category_1 : expenses, ...}, ...}
+
+    Returns:
+        dict: Same dictionary as analyze_historical_spending
+    '''
+    # Total expenses by categories for all time:
+    # {category_1 : expenses, category_2 : expenses, ...}
+    category_totals = {}
+    # Total expenses by seasons, seasons in order of their first month in the data.
+    season_totals = {}
+    for period, month_data in months_data.items():
+        for category, value in month_data.items():
+            category_totals[category] = category_totals.get(category, 0) + value
+        season = SEASON_OF_MONTH[period[1]]
+        season_totals[season] = season_totals.get(season, 0) + sum(month_data.values())
+
+    return _summary(months_data, list(category_totals), list(category_totals.values()),
+                    season_totals, len(months_data))
+
+
+def create_budget_template(time_stats: dict, analysis: dict, forecast: dict = None) -> dict:
     '''
     Creates a budget template based on historical spending analysis.
 
     Args:
         time_stats (dict): Time-based statistics containing income and expense data
         analysis (dict): Analysis data from analyze_historical_spending function
+        forecast (dict): Optional forecast of the next month from forecast.py.
+            With it the template is the budget of that month: the expenses
+            of the categories are the forecast ones, savings are the average
+            monthly income minus the forecast expenses and the average
+            monthly outflows of the other types (all that is not income
+            is spent, as in the historical template)
 
     Returns:
         dict: Budget allocation percentages for three categories:
@@ -173,12 +156,31 @@ def create_budget_template(time_stats: dict, analysis: dict) -> dict:
             - 2: Non-essential expenses (entertainment, clothing, education)
             - 3: Savings
     '''
+    if forecast is not None:
+        expenses = forecast['expenses']
+        months = len(time_stats) or 1
+        income = sum(data_month[ru.INCOME] for data_month in time_stats.values()) / months
+        # Outflows that are not of type "расход" (transfers and so on) are
+        # not forecast, their monthly average is spent as before.
+        outflows = sum(data_month[ru.EXPENSE] for data_month in time_stats.values())
+        spent = sum(sum(month_data.values())
+                    for month_data in analysis['category data by month'].values())
+        other = (outflows - spent) / months
+
+        budget_allocation_percentage = {1: 0, 2: 0, 3: income - other - sum(expenses.values())}
+        for category, value in expenses.items():
+            if category in budget_category.first_group:
+                budget_allocation_percentage[1] += value
+            if category in budget_category.second_group:
+                budget_allocation_percentage[2] += value
+        return budget_allocation_percentage
+
     # Dictionary with expense data by categories by months:
-    # {month number : {category_1 : expenses, category_2 : expenses, ...}, ...}
+    # {(year, month) : {category_1 : expenses, category_2 : expenses, ...}, ...}
     months_data = analysis['category data by month']
 
     # time_stats - dictionary with data for each month:
-    # {month_number : {income : value, expense : value, popular categories : list}, ...}
+    # {(year, month) : {income : value, expense : value, popular categories : list}, ...}
 
     # Savings for each month
     saving_dict = {}
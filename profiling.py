@@ -0,0 +1,186 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import import_financial_data_ru as fdi
+import catigorize as cat
+import statistic as stat
+import planing as plan
+import records
+
+
+# Profiling is switched on by --profile or by this environment variable.
+PROFILE_ENV = 'FINANCE_PROFILE'
+
+PROFILED_MODULES = (fdi, cat, stat, plan)
+
+# Profiler that is currently installed, None when profiling is off.
+active = None
+
+
+def is_requested() -> bool:
+    '''
+    True if the environment variable asks for profiling.
+    '''
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+
+def _rows(args: tuple, result) -> int:
+    '''
+    Number of processed rows: the length of the first argument
+    or of the result, if it is a list of transactions.
+    '''
+    for value in (args[0] if args else None, result):
+        if isinstance(value, list):
+            if not value or isinstance(value[0], (list, dict, records.Transaction)):
+                return len(value)
+        elif hasattr(value, '__len__') and not isinstance(value, (str, dict, tuple)):
+            return len(value)
+    return 0
+
+
+class Profiler:
+    '''
+    Records wall time, CPU time, processed rows and peak memory
+    (through tracemalloc) for the stages of main() and for the public
+    functions of the profiled modules.
+
+    Times are inclusive: a function that calls another one
+    also counts the time of the inner call.
+    '''
+
+    def __init__(self):
+        self.records = {}
+        self._originals = []
+        # Peak memory seen by every open measurement, innermost last.
+        self._peaks = []
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        '''
+        Measures the body of the with-statement. The yielded dictionary
+        may get a 'rows' value from the caller.
+        '''
+        extra = {}
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield extra
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self._add(name, wall, cpu, extra.get('rows', 0), peak - start_memory)
+
+    def _add(self, name: str, wall: float, cpu: float, rows: int, memory: int) -> None:
+        record = self.records.setdefault(name, {'calls': 0, 'wall seconds': 0.0,
+                                                'cpu seconds': 0.0, 'rows': 0,
+                                                'peak memory bytes': 0})
+        record['calls'] += 1
+        record['wall seconds'] += wall
+        record['cpu seconds'] += cpu
+        record['rows'] += rows
+        record['peak memory bytes'] = max(record['peak memory bytes'], memory)
+
+    def wrap(self, name: str, function):
+        '''
+        Returns the function with measurement around every call.
+        For a generator function every step of the generator is measured
+        and every yielded value counts as a row.
+        '''
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                generator = function(*args, **kwargs)
+                while True:
+                    with self.measure(name) as extra:
+                        try:
+                            value = next(generator)
+                        except StopIteration:
+                            return
+                        extra['rows'] = 1
+                    yield value
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.measure(name) as extra:
+                result = function(*args, **kwargs)
+                extra['rows'] = _rows(args, result)
+            return result
+        return wrapper
+
+    def install(self, modules=PROFILED_MODULES) -> None:
+        '''
+        Replaces the public functions of the modules with measured ones
+        and starts tracemalloc.
+        '''
+        global active
+        for module in modules:
+            for name, function in list(vars(module).items()):
+                if (inspect.isfunction(function) and not name.startswith('_')
+                        and function.__module__ == module.__name__):
+                    self._originals.append((module, name, function))
+                    setattr(module, name,
+                            self.wrap(f'{module.__name__}.{name}', function))
+        tracemalloc.start()
+        active = self
+
+    def uninstall(self) -> None:
+        '''
+        Puts the original functions back and stops tracemalloc.
+        '''
+        global active
+        for module, name, function in self._originals:
+            setattr(module, name, function)
+        self._originals = []
+        tracemalloc.stop()
+        active = None
+
+    def summary(self) -> dict:
+        '''
+        Returns the records with rows per second added.
+        '''
+        summary = {}
+        for name, record in self.records.items():
+            record = dict(record)
+            record['wall seconds'] = round(record['wall seconds'], 6)
+            record['cpu seconds'] = round(record['cpu seconds'], 6)
+            record['rows per second'] = (round(record['rows'] / record['wall seconds'])
+                                         if record['rows'] and record['wall seconds']
+                                         else None)
+            summary[name] = record
+        return summary
+
+    def write_summary(self, file=None) -> None:
+        '''
+        Writes the summary as JSON (to stderr by default,
+        so it does not get into the report on stdout).
+        '''
+        file = file or sys.stderr
+        file.write(json.dumps({'profile': self.summary()},
+                              ensure_ascii=False, indent=2) + '\n')
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    '''
+    Measures a stage of main() if profiling is on, otherwise does nothing.
+    The yielded dictionary may get a 'rows' value.
+    '''
+    if active is None:
+        yield {}
+        return
+    with active.measure(name) as extra:
+        yield extra
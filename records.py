@@ -0,0 +1,284 @@
+import ru_local as ru
+import statistic as stat
+
+
+class InternTable:
+    '''
+    Gives every distinct string a small integer code.
+    Each string is kept once, however many transactions use it.
+    '''
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class InternTables:
+    '''
+    The intern tables of one list of transactions, and the period
+    (year, month) of every date code, computed once per date.
+    They belong to the list, so they are freed with it.
+    '''
+    __slots__ = ('dates', 'descriptions', 'types', 'categories', '_periods')
+
+    def __init__(self):
+        self.dates = InternTable()
+        self.descriptions = InternTable()
+        self.types = InternTable()
+        self.categories = InternTable()
+        self._periods = []
+
+    def periods(self) -> list:
+        '''
+        Period of every date code. Only dates added since the last call
+        are parsed.
+        '''
+        periods = self._periods
+        for date in self.dates.values[len(periods):]:
+            periods.append(stat.period_key(date))
+        return periods
+
+
+# Category code of a transaction that is not categorized yet.
+NO_CATEGORY = -1
+
+
+def to_kopecks(amount: float) -> int:
+    '''
+    Amount in rubles as an integer number of kopecks.
+    '''
+    return round(amount * 100)
+
+
+class Transaction:
+    '''
+    Compact transaction: the amount in integer kopecks, the date,
+    description, type and category as codes of the intern tables
+    of its list.
+
+    It is indexed like the list [date, amount, description, type, category]
+    (amount in rubles), so it can be passed to any function that takes
+    transactions as lists. An uncategorized transaction has 4 fields.
+
+    Amounts are kept to the kopeck.
+    '''
+    __slots__ = ('tables', 'date_code', 'kopecks', 'description_code', 'type_code',
+                 'category_code')
+
+    def __init__(self, tables: InternTables, date_code: int, kopecks: int,
+                 description_code: int, type_code: int, category_code: int = NO_CATEGORY):
+        self.tables = tables
+        self.date_code = date_code
+        self.kopecks = kopecks
+        self.description_code = description_code
+        self.type_code = type_code
+        self.category_code = category_code
+
+    @classmethod
+    def pack(cls, transaction, tables: InternTables = None) -> 'Transaction':
+        '''
+        Makes a compact transaction of [date, amount, description, type]
+        or [date, amount, description, type, category] with the codes
+        of tables (new tables if not given).
+        '''
+        tables = tables or InternTables()
+        category_code = (tables.categories.code(transaction[4]) if len(transaction) > 4
+                         else NO_CATEGORY)
+        return cls(tables, tables.dates.code(transaction[0]), to_kopecks(transaction[1]),
+                   tables.descriptions.code(transaction[2]), tables.types.code(transaction[3]),
+                   category_code)
+
+    def with_category(self, category: str) -> 'Transaction':
+        '''
+        Returns the same transaction with the category set.
+        '''
+        return Transaction(self.tables, self.date_code, self.kopecks, self.description_code,
+                           self.type_code, self.tables.categories.code(category))
+
+    def __len__(self) -> int:
+        return 4 if self.category_code == NO_CATEGORY else 5
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+
+        tables = self.tables
+        if index == 0:
+            return tables.dates.values[self.date_code]
+        if index == 1:
+            return self.kopecks / 100
+        if index == 2:
+            return tables.descriptions.values[self.description_code]
+        if index == 3:
+            return tables.types.values[self.type_code]
+        if index == 4 and self.category_code != NO_CATEGORY:
+            return tables.categories.values[self.category_code]
+        raise IndexError('transaction index out of range')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other) -> bool:
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'Transaction({list(self)!r})'
+
+    def __reduce__(self):
+        # A single transaction is unpickled with tables of its own.
+        return self.pack, (list(self),)
+
+
+class TransactionList(stat.StatisticsMixin, list):
+    '''
+    List of compact transactions that share the intern tables of the list.
+    The statistics functions in statistic.py and planing.py add up
+    integer kopecks when they get this list, so the sums do not drift.
+    '''
+
+    def __init__(self, transactions=(), tables: InternTables = None):
+        super().__init__(transactions)
+        self.tables = tables or (self[0].tables if self else InternTables())
+
+    @classmethod
+    def pack(cls, transactions) -> 'TransactionList':
+        '''
+        Packs any iterable of transactions as lists into new tables.
+        '''
+        tables = InternTables()
+        return cls((Transaction.pack(transaction, tables) for transaction in transactions),
+                   tables)
+
+    def __reduce__(self):
+        # The list is unpickled with one set of tables for all its transactions.
+        return self.pack, ([list(transaction) for transaction in self],)
+
+
+def _rubles(kopecks: int, count: int):
+    '''
+    An empty group gives 0 like the loop version, not 0.0.
+    '''
+    return kopecks / 100 if count else 0
+
+
+def _type_code(transactions: TransactionList, transaction_type: str):
+    # None if no transaction has this type, then nothing matches it.
+    return transactions.tables.types.codes.get(transaction_type)
+
+
+def calculate_basic_stats(transactions: TransactionList) -> dict:
+    '''
+    statistic.calculate_basic_stats on kopecks.
+    '''
+    income_code = _type_code(transactions, ru.INCOME)
+    income, expenses = [0, 0], [0, 0]
+    for transaction in transactions:
+        totals = income if transaction.type_code == income_code else expenses
+        totals[0] += transaction.kopecks
+        totals[1] += 1
+
+    return {ru.INCOME: _rubles(*income),
+            ru.EXPENSE: _rubles(*expenses),
+            ru.BALANCE: (income[0] - expenses[0]) / 100 if transactions else 0,
+            ru.TRANSACTIONS_QUANTITY: len(transactions)}
+
+
+def calculate_by_category(transactions: TransactionList) -> dict:
+    '''
+    statistic.calculate_by_category on kopecks.
+    '''
+    income_code = _type_code(transactions, ru.INCOME)
+    # {category code : [kopecks, number of transactions], ...}
+    totals = {}
+    total_expenses = 0
+    for transaction in transactions:
+        if transaction.type_code == income_code:
+            continue
+        total_expenses += transaction.kopecks
+        category_totals = totals.get(transaction.category_code)
+        if category_totals is None:
+            totals[transaction.category_code] = [transaction.kopecks, 1]
+        else:
+            category_totals[0] += transaction.kopecks
+            category_totals[1] += 1
+
+    category_info = {}
+    for code, (kopecks, quantity) in totals.items():
+        percent = round(kopecks / total_expenses * 100, 2)
+        category_info[transactions.tables.categories.values[code]] = [kopecks / 100, quantity, percent]
+    return category_info
+
+
+def analyze_by_time(transactions: TransactionList) -> dict:
+    '''
+    statistic.analyze_by_time on kopecks.
+    '''
+    income_code = _type_code(transactions, ru.INCOME)
+    periods = transactions.tables.periods()
+    # {(year, month) : [income, number of incomes, expenses, number of expenses], ...}
+    totals = {}
+    # {(year, month) : {category code : number of transactions, ...}, ...}
+    month_categories = {}
+
+    for transaction in transactions:
+        month = periods[transaction.date_code]
+        if month not in totals:
+            totals[month] = [0, 0, 0, 0]
+            month_categories[month] = {}
+
+        offset = 0 if transaction.type_code == income_code else 2
+        totals[month][offset] += transaction.kopecks
+        totals[month][offset + 1] += 1
+
+        quantity_category = month_categories[month]
+        code = transaction.category_code
+        quantity_category[code] = quantity_category.get(code, 0) + 1
+
+    categories = transactions.tables.categories.values
+    month_info = {}
+    for month, (income, incomes, expenses, expense_count) in totals.items():
+        quantity_category = month_categories[month]
+        n = max(quantity_category.values())
+        month_info[month] = {
+            ru.INCOME: _rubles(income, incomes),
+            ru.EXPENSE: _rubles(expenses, expense_count),
+            ru.POPULAR_CATEGORIES: [categories[code] for code in quantity_category
+                                    if quantity_category[code] == n]}
+    return month_info
+
+
+def expenses_by_month(transactions: TransactionList) -> dict:
+    '''
+    Expenses of type "расход" by month and category on kopecks,
+    the input of planing.summarize_months_data.
+    '''
+    expense_code = _type_code(transactions, ru.EXPENSE)
+    periods = transactions.tables.periods()
+    # {(year, month) : {category code : kopecks, ...}, ...}
+    months_kopecks = {}
+    for transaction in transactions:
+        month_data = months_kopecks.setdefault(periods[transaction.date_code], {})
+        if transaction.type_code == expense_code:
+            code = transaction.category_code
+            month_data[code] = month_data.get(code, 0) + transaction.kopecks
+
+    return {month: {transactions.tables.categories.values[code]: kopecks / 100
+                    for code, kopecks in month_data.items()}
+            for month, month_data in months_kopecks.items()}
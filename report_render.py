@@ -0,0 +1,299 @@
+import csv
+import html
+import io
+import json
+import sys
+
+import ru_local as ru
+
+
+def _json_ready(value):
+    '''
+    Makes report structures JSON-compatible: (year, month) keys
+    become 'YYYY-MM' strings, tuples become lists.
+    '''
+    if isinstance(value, dict):
+        return {_period_name(key): _json_ready(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_ready(item) for item in value]
+    return value
+
+
+def _period_name(key) -> str:
+    if isinstance(key, tuple) and len(key) == 2:
+        return f'{key[0]:04d}-{key[1]:02d}'
+    return key if isinstance(key, str) else str(key)
+
+
+def report_as_dict(stats: dict, category_stats: dict, time_stats: dict,
+                   analysis: dict, budget) -> dict:
+    '''
+    Puts the arguments of print_report() into one JSON-compatible dictionary.
+    '''
+    return _json_ready({'stats': stats,
+                        'category_stats': category_stats,
+                        'time_stats': time_stats,
+                        'analysis': analysis,
+                        'budget': budget})
+
+
+def render_console(stats: dict, category_stats: dict, time_stats: dict,
+                   analysis: dict, budget) -> str:
+    '''
+    The human-readable report of print_report() as one string.
+    '''
+    parts = []
+    add = parts.append
+
+    add(f'{ru.PR_FINANCIAL_REPORT}\n\n')
+
+    add('\n'.join([ru.PR_KEY_INDICATORS,
+                   f'{ru.PR_INCOME} {stats[ru.INCOME]} {ru.PR_RUB}',
+                   f'{ru.PR_EXPENSE}: {stats[ru.EXPENSE]} {ru.PR_RUB}',
+                   f'{ru.PR_BALANCE} {stats[ru.BALANCE]} {ru.PR_RUB}',
+                   f'{ru.PR_NUM_TRANS} {stats[ru.TRANSACTIONS_QUANTITY]}']) + '\n\n')
+
+    add(f'{ru.PR_CATEGORY_EXPENSES}\n')
+    for category, (expenses, quantity, percent) in category_stats.items():
+        add(f'{ru.PR_CATEGORY} {category}\n')
+        add(f'{ru.PR_EXPENSES}: {expenses}, '
+            f'{ru.PR_TRANSACTION_COUNT}: {quantity}, '
+            f'{ru.PR_PERCENT_OF_TOTAL}: {percent} %\n\n')
+
+    add(f'{ru.PR_MONTHLY_EXPENSES}\n')
+    for (year, month), month_info in time_stats.items():
+        add(f'{ru.PR_MONTH} {ru.month_ru[month]} {year}\n')
+        add(f'{ru.PR_INCOMES}: {month_info[ru.INCOME]} '
+            f'{ru.PR_EXPENSES}: {month_info[ru.EXPENSE]} '
+            f'{ru.PR_POPULAR_CATEGORIES}: ')
+        for category in month_info[ru.POPULAR_CATEGORIES]:
+            add(f'{category} ')
+        add('\n\n')
+
+    add(f'{ru.PR_HISTORICAL_ANALYSIS}\n')
+    add(f'{ru.PR_AVERAGE_COSTS}:\n')
+    for category, value in analysis['average costs'].items():
+        add(f'{category} : {value}\n')
+    add('\n')
+
+    (high_season, high_value), (low_season, low_value) = analysis['seasonal patterns']
+    add(f'{ru.PR_SEASONAL_PATTERNS}:\n')
+    add(f'{ru.PR_SEASON_PAT_HIGH_COSTS} {high_season} '
+        f'{ru.PR_SEASON_PAT_EQUAL} {high_value} {ru.PR_RUB}\n')
+    add(f'{ru.PR_SEASON_PAT_SMALL_COSTS} {low_season} '
+        f'{ru.PR_SEASON_PAT_EQUAL} {low_value} {ru.PR_RUB}\n\n')
+
+    add(f'{ru.PR_BIGGEST_EXPENSES}:\n')
+    for category, value in analysis['biggest expenses'].items():
+        add(f'{category} : {value}\n')
+    add('\n')
+
+    category, decrease = analysis['recommendations']
+    add(f'{ru.PR_RECOMMENDATIONS}:\n')
+    add(f'{ru.PR_RECOMMEND_PLAN} {category} {ru.PR_BY} {decrease}%\n\n')
+
+    if 'forecast' in analysis:
+        year, month = analysis['forecast']['period']
+        add(f'{ru.PR_FORECAST} {ru.month_ru[month]} {year}:\n')
+        for category, value in analysis['forecast']['expenses'].items():
+            add(f'{category} : {value}\n')
+        add('\n')
+
+    # Sections of SpendingSketches, only when distributions were collected.
+    if 'largest expenses' in analysis:
+        add(f'{ru.PR_LARGEST_EXPENSES}:\n')
+        for date, amount, description, category in analysis['largest expenses']:
+            add(f'{date} {amount} {ru.PR_RUB} {description} ({category})\n')
+        add('\n')
+
+        add(f'{ru.PR_CATEGORY_QUANTILES}:\n')
+        for category, values in analysis['quantiles by category'].items():
+            add(f'{category} : {ru.PR_MEDIAN} {values["median"]}, '
+                f'{ru.PR_P95} {values["p95"]}\n')
+        add('\n')
+
+        add(f'{ru.PR_MONTH_QUANTILES}:\n')
+        for (year, month), values in analysis['quantiles by month'].items():
+            add(f'{ru.month_ru[month]} {year} : {ru.PR_MEDIAN} {values["median"]}, '
+                f'{ru.PR_P95} {values["p95"]}\n')
+        add('\n')
+
+    add('\n'.join([ru.PR_BUDGET,
+                   ru.PR_BUDGET_DISTRIBUTION,
+                   ru.PR_BUDGET_ESSENTIALS,
+                   ru.PR_BUDGET_LIFESTYLE,
+                   ru.PR_BUDGET_SAVINGS]) + '\n')
+
+    if budget[0]:
+        add(f'{ru.PR_BUDGET_SUCCESS}\n')
+    else:
+        add(f'{ru.PR_BUDGET_FAILURE}\n')
+        add(f'{ru.PR_BUDGET_CATEGORY_1} {budget[1]}\n'
+            f'{ru.PR_BUDGET_CATEGORY_2} {budget[2]}\n'
+            f'{ru.PR_BUDGET_CATEGORY_3} {budget[3]}\n')
+
+    return ''.join(parts)
+
+
+def render_json(stats: dict, category_stats: dict, time_stats: dict,
+                analysis: dict, budget) -> str:
+    '''
+    The report structures as one JSON document, months as 'YYYY-MM'.
+    '''
+    report = report_as_dict(stats, category_stats, time_stats, analysis, budget)
+    return json.dumps(report, ensure_ascii=False, indent=2) + '\n'
+
+
+def report_rows(stats: dict, category_stats: dict, time_stats: dict,
+                analysis: dict, budget) -> list:
+    '''
+    The report structures as flat rows (section, key, field, value).
+    '''
+    rows = [('stats', '', field, value) for field, value in stats.items()]
+
+    for category, (expenses, quantity, percent) in category_stats.items():
+        rows += [('category_stats', category, 'expenses', expenses),
+                 ('category_stats', category, 'transactions', quantity),
+                 ('category_stats', category, 'percent', percent)]
+
+    for period, month_info in time_stats.items():
+        month = _period_name(period)
+        rows += [('time_stats', month, ru.INCOME, month_info[ru.INCOME]),
+                 ('time_stats', month, ru.EXPENSE, month_info[ru.EXPENSE]),
+                 ('time_stats', month, ru.POPULAR_CATEGORIES,
+                  ';'.join(month_info[ru.POPULAR_CATEGORIES]))]
+
+    rows += [('average costs', category, '', value)
+             for category, value in analysis['average costs'].items()]
+    (high_season, high_value), (low_season, low_value) = analysis['seasonal patterns']
+    rows += [('seasonal patterns', high_season, 'highest', high_value),
+             ('seasonal patterns', low_season, 'lowest', low_value)]
+    rows += [('biggest expenses', category, '', value)
+             for category, value in analysis['biggest expenses'].items()]
+    category, decrease = analysis['recommendations']
+    rows.append(('recommendations', category, 'decrease percent', decrease))
+    for period, month_data in analysis['category data by month'].items():
+        rows += [('category data by month', _period_name(period), category, value)
+                 for category, value in month_data.items()]
+    if 'forecast' in analysis:
+        period = _period_name(tuple(analysis['forecast']['period']))
+        rows += [('forecast', period, category, value)
+                 for category, value in analysis['forecast']['expenses'].items()]
+    if 'largest expenses' in analysis:
+        for rank, (date, amount, description, category) in enumerate(
+                analysis['largest expenses'], 1):
+            rows += [('largest expenses', rank, 'date', date),
+                     ('largest expenses', rank, 'amount', amount),
+                     ('largest expenses', rank, 'description', description),
+                     ('largest expenses', rank, 'category', category)]
+        for section in ('quantiles by category', 'quantiles by month'):
+            for key, values in analysis[section].items():
+                rows += [(section, _period_name(key), field, value)
+                         for field, value in values.items()]
+
+    rows.append(('budget', '', 'error', budget[0]))
+    rows += [('budget', group, 'share', share) for group, share in budget[1].items()]
+    return rows
+
+
+def render_csv(stats: dict, category_stats: dict, time_stats: dict,
+               analysis: dict, budget) -> str:
+    '''
+    The report as CSV with the columns section, key, field, value.
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(('section', 'key', 'field', 'value'))
+    writer.writerows(report_rows(stats, category_stats, time_stats, analysis, budget))
+    return buffer.getvalue()
+
+
+def _html_table(title: str, header: tuple, rows) -> str:
+    cells = ''.join(f'<th>{html.escape(str(name))}</th>' for name in header)
+    body = ''.join('<tr>' + ''.join(f'<td>{html.escape(str(value))}</td>' for value in row)
+                   + '</tr>\n' for row in rows)
+    return (f'<h2>{html.escape(title)}</h2>\n'
+            f'<table>\n<thead><tr>{cells}</tr></thead>\n<tbody>\n{body}</tbody>\n</table>\n')
+
+
+def render_html(stats: dict, category_stats: dict, time_stats: dict,
+                analysis: dict, budget) -> str:
+    '''
+    The report as a standalone HTML page with one table per section.
+    '''
+    (high_season, high_value), (low_season, low_value) = analysis['seasonal patterns']
+    category, decrease = analysis['recommendations']
+
+    tables = [
+        _html_table(ru.PR_KEY_INDICATORS, ('', ''), stats.items()),
+        _html_table(ru.PR_CATEGORY_EXPENSES,
+                    (ru.PR_CATEGORY, ru.PR_EXPENSES, ru.PR_TRANSACTION_COUNT,
+                     ru.PR_PERCENT_OF_TOTAL),
+                    ((name, *values) for name, values in category_stats.items())),
+        _html_table(ru.PR_MONTHLY_EXPENSES,
+                    (ru.PR_MONTH, ru.PR_INCOMES, ru.PR_EXPENSES, ru.PR_POPULAR_CATEGORIES),
+                    ((f'{ru.month_ru[month]} {year}', info[ru.INCOME], info[ru.EXPENSE],
+                      ' '.join(info[ru.POPULAR_CATEGORIES]))
+                     for (year, month), info in time_stats.items())),
+        _html_table(ru.PR_AVERAGE_COSTS, (ru.PR_CATEGORY, ''),
+                    analysis['average costs'].items()),
+        _html_table(ru.PR_SEASONAL_PATTERNS, ('', '', ''),
+                    ((ru.PR_SEASON_PAT_HIGH_COSTS, high_season, high_value),
+                     (ru.PR_SEASON_PAT_SMALL_COSTS, low_season, low_value))),
+        _html_table(ru.PR_BIGGEST_EXPENSES, (ru.PR_CATEGORY, ''),
+                    analysis['biggest expenses'].items()),
+        _html_table(ru.PR_RECOMMENDATIONS, (ru.PR_CATEGORY, '%'), ((category, decrease),)),
+    ]
+    if 'forecast' in analysis:
+        year, month = analysis['forecast']['period']
+        tables.append(_html_table(f'{ru.PR_FORECAST} {ru.month_ru[month]} {year}',
+                                  (ru.PR_CATEGORY, ru.PR_EXPENSES),
+                                  analysis['forecast']['expenses'].items()))
+    if 'largest expenses' in analysis:
+        tables += [
+            _html_table(ru.PR_LARGEST_EXPENSES, ('', ru.PR_EXPENSES, '', ru.PR_CATEGORY),
+                        analysis['largest expenses']),
+            _html_table(ru.PR_CATEGORY_QUANTILES, (ru.PR_CATEGORY, ru.PR_MEDIAN, ru.PR_P95),
+                        ((category, values['median'], values['p95'])
+                         for category, values in analysis['quantiles by category'].items())),
+            _html_table(ru.PR_MONTH_QUANTILES, (ru.PR_MONTH, ru.PR_MEDIAN, ru.PR_P95),
+                        ((f'{ru.month_ru[month]} {year}', values['median'], values['p95'])
+                         for (year, month), values in analysis['quantiles by month'].items())),
+        ]
+    tables += [
+        _html_table(ru.PR_BUDGET, ('', ''),
+                    (('', ru.PR_BUDGET_SUCCESS if budget[0] else ru.PR_BUDGET_FAILURE),
+                     *budget[1].items())),
+    ]
+    return ('<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+            f'<title>{html.escape(ru.PR_FINANCIAL_REPORT)}</title>\n</head>\n<body>\n'
+            f'<h1>{html.escape(ru.PR_FINANCIAL_REPORT)}</h1>\n'
+            + ''.join(tables) + '</body>\n</html>\n')
+
+
+# Output formats: {name : (renderer, file extension), ...}
+RENDERERS = {
+    'console': (render_console, 'txt'),
+    'json': (render_json, 'json'),
+    'csv': (render_csv, 'csv'),
+    'html': (render_html, 'html'),
+}
+
+
+def render(output_format: str, *report_data) -> str:
+    '''
+    Renders the arguments of print_report() in one of the RENDERERS formats.
+    '''
+    try:
+        renderer = RENDERERS[output_format][0]
+    except KeyError:
+        raise ValueError(f'unknown report format: {output_format}') from None
+    return renderer(*report_data)
+
+
+def write_report(output_format: str, report_data: tuple, file=None) -> None:
+    '''
+    Renders the report into one buffer and writes it with a single call
+    (to stdout by default).
+    '''
+    (file or sys.stdout).write(render(output_format, *report_data))
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import import_financial_data_ru as fdi
+import catigorize as cat
+import aggregation as agg
+import planing as plan
+import main
+import report_render as render
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest accepted request body.
+MAX_BODY_SIZE = 256 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def report_from_records(records: list) -> dict:
+    '''
+    Builds the report of a batch of transactions: dictionaries with the same
+    fields as in the data files, or lists [date, amount, description, type].
+    '''
+    keys = None
+
+    def converted():
+        nonlocal keys
+        for record in records:
+            if isinstance(record, dict):
+                keys = keys or fdi.find_keys(record)
+                yield fdi.convert_record(record, keys)
+            else:
+                date, amount, description, trans_type = record
+                yield [date, float(amount), description, trans_type]
+
+    transactions = converted()
+    report = agg.ReportAccumulator().add_all(cat.iter_categorized_transactions(transactions))
+    time_stats = report.by_time()
+    analysis = report.historical()
+    budget = plan.compare_budget_vs_actual(plan.create_budget_template(time_stats, analysis))
+    return render.report_as_dict(report.basic_stats(), report.by_category(), time_stats,
+                                 analysis, budget)
+
+
+def report_from_file(filename: str) -> dict:
+    '''
+    Builds the report of a data file (runs in a worker process).
+    '''
+    # The progress bar of the import would go to the server log.
+    with contextlib.redirect_stderr(io.StringIO()):
+        return render.report_as_dict(*main.build_report(filename))
+
+
+def _warm_up() -> None:
+    '''
+    Builds the keyword matcher once in every worker process.
+    '''
+    cat.get_default_matcher()
+
+
+class ReportServer:
+    '''
+    Local HTTP service that returns report structures as JSON.
+
+    POST /report  {"file": "path"}           - report of a data file
+    POST /report  {"transactions": [...]}    - report of a batch
+    GET  /health                             - {"status": "ok"}
+
+    The categorizer is built once at start. Files are parsed on a process
+    pool, batches of transactions on a thread pool, so the event loop
+    keeps accepting requests while reports are being built.
+    '''
+
+    def __init__(self, processes: int = None, threads: int = None):
+        _warm_up()
+        self.processes = ProcessPoolExecutor(max_workers=processes, initializer=_warm_up)
+        self.threads = ThreadPoolExecutor(max_workers=threads)
+
+    async def handle(self, method: str, path: str, body: bytes) -> tuple:
+        '''
+        Returns (status, JSON-compatible answer) for one request.
+        '''
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method != 'POST' or path != '/report':
+            return 404, {'error': 'unknown request'}
+
+        try:
+            request = json.loads(body.decode('UTF-8'))
+        except ValueError as error:
+            return 400, {'error': f'invalid JSON: {error}'}
+
+        loop = asyncio.get_running_loop()
+        try:
+            if isinstance(request, dict) and 'file' in request:
+                answer = await loop.run_in_executor(self.processes, report_from_file,
+                                                    request['file'])
+            elif isinstance(request, dict) and 'transactions' in request:
+                answer = await loop.run_in_executor(self.threads, report_from_records,
+                                                    request['transactions'])
+            else:
+                return 400, {'error': 'expected "file" or "transactions"'}
+        except Exception as error:
+            return 500, {'error': f'{type(error).__name__}: {error}'}
+        return 200, answer
+
+    async def serve_connection(self, reader: asyncio.StreamReader,
+                               writer: asyncio.StreamWriter) -> None:
+        '''
+        Reads HTTP/1.1 requests from one connection, keeping it alive
+        until the client closes it or asks to.
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    status, answer = 413, {'error': 'request is too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, answer = await self.handle(method, path.split('?')[0], body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                content = json.dumps(answer, ensure_ascii=False).encode('UTF-8')
+                writer.write((f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                              'Content-Type: application/json; charset=utf-8\r\n'
+                              f'Content-Length: {len(content)}\r\n'
+                              f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                              '\r\n').encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  unix_socket: str = None) -> None:
+        '''
+        Serves requests on localhost TCP or on a Unix socket until cancelled.
+        '''
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.serve_connection, unix_socket)
+        else:
+            server = await asyncio.start_server(self.serve_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.processes.shutdown(cancel_futures=True)
+            self.threads.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local report service.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', default=None,
+                        help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes for file reports')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='worker threads for transaction batches')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(ReportServer(args.processes, args.threads)
+                    .run(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
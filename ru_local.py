@@ -41,6 +41,14 @@ PR_BIGGEST_EXPENSES = 'Самые большие траты в категори
 PR_RECOMMENDATIONS = 'Рекомендации для планирования'
 PR_RECOMMEND_PLAN = 'Попробуйте сократить траты на'
 PR_BY = 'на'
+PR_LARGEST_EXPENSES = 'Самые крупные траты'
+PR_CATEGORY_QUANTILES = 'Медиана и 95-й процентиль трат по категориям'
+PR_MONTH_QUANTILES = 'Медиана и 95-й процентиль трат по месяцам'
+PR_MEDIAN = 'медиана'
+PR_P95 = '95-й процентиль'
+PR_FORECAST = 'Прогноз расходов на'
+PR_DUPLICATES = 'Удалено повторяющихся транзакций:'
+PR_CACHE_STATS = 'Кэш категорий: попаданий {hits}, промахов {misses}, записей {size}'
 
 # Budget
 PR_BUDGET_DISTRIBUTION = 'Вам предлагается следующее бюджетное распределение, в соответствии с потребностями современного человека:'
@@ -0,0 +1,183 @@
+import heapq
+import math
+
+import ru_local as ru
+import statistic as stat
+
+
+# Number of largest expenses kept by default.
+DEFAULT_TOP = 10
+
+# Relative error of the quantiles.
+DEFAULT_ACCURACY = 0.01
+
+
+class TopK:
+    '''
+    The k largest values seen so far, with their transactions.
+    A min-heap of size k: every new value costs O(log k), memory is O(k).
+    '''
+
+    def __init__(self, k: int = DEFAULT_TOP):
+        self.k = k
+        # [(value, sequence number, item), ...], smallest value first.
+        self.heap = []
+        self.seen = 0
+
+    def add(self, value: float, item) -> None:
+        # The sequence number keeps the earlier of equal values.
+        entry = (value, -self.seen, item)
+        self.seen += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def merge(self, other: 'TopK') -> 'TopK':
+        '''
+        Adds the values of another part of the data, which comes after this one.
+        '''
+        for value, _, item in sorted(other.heap, key=lambda entry: -entry[1]):
+            self.add(value, item)
+        self.seen += other.seen - len(other.heap)
+        return self
+
+    def items(self) -> list:
+        '''
+        The kept items, largest value first.
+        '''
+        return [item for _, _, item in sorted(self.heap, key=lambda entry: entry[:2],
+                                              reverse=True)]
+
+
+class QuantileSketch:
+    '''
+    Mergeable quantile sketch with relative error (DDSketch):
+    a value x goes to the bucket ceil(log(x) / log(gamma)), the quantile
+    is the middle of the bucket where the rank is reached.
+
+    Any quantile is within `accuracy` of the true value relative to it.
+    The number of buckets grows with the logarithm of the value range,
+    so memory is bounded. Two sketches with the same accuracy are merged
+    by adding their bucket counts.
+    '''
+
+    def __init__(self, accuracy: float = DEFAULT_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # {bucket index : number of values, ...}
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        '''
+        Adds a non-negative value.
+        '''
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        if other.accuracy != self.accuracy:
+            raise ValueError('sketches with different accuracy cannot be merged')
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q: float) -> float:
+        '''
+        Value below which the share q of the values lies (0 <= q <= 1).
+        '''
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return round(2 * self.gamma ** index / (self.gamma + 1), 2)
+        return round(2 * self.gamma ** max(self.buckets) / (self.gamma + 1), 2)
+
+
+class SpendingSketches:
+    '''
+    Distribution of expenses collected in one pass:
+        the largest expenses,
+        median and p95 of the expense size by category and by month.
+
+    Expenses are all transactions that are not income, as in statistic.py,
+    their size is the absolute amount. Parts of the data are combined
+    with merge() in the order of the data.
+    '''
+
+    def __init__(self, top: int = DEFAULT_TOP, accuracy: float = DEFAULT_ACCURACY):
+        self.accuracy = accuracy
+        self.largest = TopK(top)
+        # {category : QuantileSketch, ...}
+        self.by_category = {}
+        # {(year, month) : QuantileSketch, ...}
+        self.by_month = {}
+
+    def _sketch(self, sketches: dict, key) -> QuantileSketch:
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = QuantileSketch(self.accuracy)
+        return sketch
+
+    def add(self, transaction) -> None:
+        '''
+        Adds one transaction [date, amount, description, type, category].
+        '''
+        if transaction[3] == ru.INCOME:
+            return
+        size = abs(transaction[1])
+        category = transaction[4]
+        self.largest.add(size, (transaction[0], transaction[1], transaction[2], category))
+        self._sketch(self.by_category, category).add(size)
+        self._sketch(self.by_month, stat.period_key(transaction[0])).add(size)
+
+    def add_all(self, transactions) -> 'SpendingSketches':
+        for transaction in transactions:
+            self.add(transaction)
+        return self
+
+    def feed(self, transactions):
+        '''
+        Generator that adds every transaction while passing it on,
+        so the sketches are filled by the pass that consumes the stream.
+        '''
+        for transaction in transactions:
+            self.add(transaction)
+            yield transaction
+
+    def merge(self, other: 'SpendingSketches') -> 'SpendingSketches':
+        self.largest.merge(other.largest)
+        for sketches, other_sketches in ((self.by_category, other.by_category),
+                                         (self.by_month, other.by_month)):
+            for key, sketch in other_sketches.items():
+                self._sketch(sketches, key).merge(sketch)
+        return self
+
+    def sections(self) -> dict:
+        '''
+        New sections of the historical analysis:
+            'largest expenses': [(date, amount, description, category), ...]
+            'quantiles by category': {category : {'median' : value, 'p95' : value}, ...}
+            'quantiles by month': {(year, month) : {'median' : value, 'p95' : value}, ...}
+        '''
+        def quantiles(sketches: dict) -> dict:
+            return {key: {'median': sketch.quantile(0.5), 'p95': sketch.quantile(0.95)}
+                    for key, sketch in sketches.items()}
+
+        return {'largest expenses': self.largest.items(),
+                'quantiles by category': quantiles(self.by_category),
+                'quantiles by month': quantiles(self.by_month)}
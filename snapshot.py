@@ -0,0 +1,225 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import import_financial_data_ru as fdi
+import catigorize as cat
+import category_cache as cc
+
+
+DEFAULT_SNAPSHOT_DIR = '.finance_cache'
+
+MAGIC = b'FINSNAP1'
+
+# Columns of the snapshot: name, array typecode.
+# Wider types go first, so every column stays aligned.
+COLUMNS = (('amounts', 'd'),
+           ('dates', 'I'),
+           ('descriptions', 'I'),
+           ('categories', 'H'),
+           ('types', 'B'))
+
+
+def file_fingerprint(filename: str) -> dict:
+    '''
+    Returns path, size, modification time and sha256 of the file content.
+    '''
+    status = os.stat(filename)
+    content_hash = hashlib.sha256()
+    with open(filename, mode='rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            content_hash.update(block)
+
+    return {'path': os.path.abspath(filename),
+            'size': status.st_size,
+            'mtime': status.st_mtime_ns,
+            'sha256': content_hash.hexdigest()}
+
+
+def snapshot_path(filename: str, directory: str = DEFAULT_SNAPSHOT_DIR) -> str:
+    '''
+    Returns the name of the snapshot file for the data file.
+    '''
+    key = hashlib.sha256(os.path.abspath(filename).encode('UTF-8')).hexdigest()
+    return os.path.join(directory, key[:32] + '.snap')
+
+
+def data_offset(header_size: int) -> int:
+    '''
+    Columns start after the header at a multiple of 8 bytes,
+    so every column is aligned in the memory map.
+    '''
+    return (len(MAGIC) + 4 + header_size + 7) // 8 * 8
+
+
+class Snapshot:
+    '''
+    Categorized transactions read from a memory-mapped snapshot.
+
+    Numeric columns are memoryviews over the map, nothing is parsed;
+    dates, descriptions, types and categories are codes into string tables.
+    Iteration yields [date, amount, description, type, category].
+
+    The map stays open until close(); the snapshot is also a context
+    manager that closes it.
+    '''
+
+    def __init__(self, filename: str):
+        with open(filename, mode='rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = None
+        try:
+            self._read_columns()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_columns(self) -> None:
+        header_size = struct.unpack_from('<I', self._map, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + header_size].decode('UTF-8'))
+
+        offset = data_offset(header_size)
+        rows = self.header['rows']
+        # A truncated file would give short columns that fail only when read.
+        row_size = sum(array(typecode).itemsize for _, typecode in COLUMNS)
+        if rows < 0 or len(self._map) < offset + rows * row_size:
+            raise ValueError('snapshot is truncated')
+
+        self._view = memoryview(self._map)
+        for name, typecode in COLUMNS:
+            size = array(typecode).itemsize * rows
+            setattr(self, name, self._view[offset:offset + size].cast(typecode))
+            offset += size
+
+        self.date_names = self.header['date names']
+        self.description_names = self.header['description names']
+        self.type_names = self.header['type names']
+        self.category_names = self.header['category names']
+
+    def __len__(self) -> int:
+        return self.header['rows']
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield [self.date_names[self.dates[i]],
+                   self.amounts[i],
+                   self.description_names[self.descriptions[i]],
+                   self.type_names[self.types[i]],
+                   self.category_names[self.categories[i]]]
+
+    def close(self) -> None:
+        '''
+        Releases the memory map. Closing twice does nothing.
+        '''
+        for name, typecode in COLUMNS:
+            column = getattr(self, name, None)
+            if column is not None:
+                column.release()
+        if self._view is not None:
+            self._view.release()
+        self._map.close()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def write_snapshot(filename: str, transactions: list, fingerprint: dict,
+                   directory: str = DEFAULT_SNAPSHOT_DIR) -> str:
+    '''
+    Writes categorized transactions [[date, amount, description, type, category], ...]
+    of the data file as a binary columnar snapshot and returns its name.
+    '''
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    tables = {'dates': {}, 'descriptions': {}, 'types': {}, 'categories': {}}
+
+    for transaction in transactions:
+        columns['amounts'].append(transaction[1])
+        for name, value in (('dates', transaction[0]),
+                            ('descriptions', transaction[2]),
+                            ('types', transaction[3]),
+                            ('categories', transaction[4])):
+            codes = tables[name]
+            columns[name].append(codes.setdefault(value, len(codes)))
+
+    header = {'fingerprint': fingerprint,
+              'keywords': cc.keywords_fingerprint(cat.create_categories()),
+              'byteorder': sys.byteorder,
+              'rows': len(columns['amounts']),
+              'date names': list(tables['dates']),
+              'description names': list(tables['descriptions']),
+              'type names': list(tables['types']),
+              'category names': list(tables['categories'])}
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('UTF-8')
+    padding = data_offset(len(header_bytes)) - len(MAGIC) - 4 - len(header_bytes)
+
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(filename, directory)
+    with open(path + '.tmp', mode='wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(header_bytes)))
+        file.write(header_bytes)
+        file.write(bytes(padding))
+        for name, typecode in COLUMNS:
+            columns[name].tofile(file)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def load_snapshot(filename: str, directory: str = DEFAULT_SNAPSHOT_DIR):
+    '''
+    Returns the Snapshot of the data file, or None if there is no snapshot,
+    it is truncated or corrupt, or the file or the keyword table changed
+    since it was written.
+    Size and modification time are checked first, the content hash last.
+    '''
+    path = snapshot_path(filename, directory)
+    try:
+        with open(path, mode='rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+        snapshot = Snapshot(path)
+    except (FileNotFoundError, ValueError, TypeError, KeyError, IndexError, struct.error):
+        return None
+
+    try:
+        header = snapshot.header
+        status = os.stat(filename)
+        saved = header['fingerprint']
+        valid = (saved['path'] == os.path.abspath(filename)
+                 and saved['size'] == status.st_size
+                 and saved['mtime'] == status.st_mtime_ns
+                 and header['byteorder'] == sys.byteorder
+                 and header['keywords'] == cc.keywords_fingerprint(cat.create_categories())
+                 and saved['sha256'] == file_fingerprint(filename)['sha256'])
+    except (TypeError, KeyError, IndexError):
+        valid = False
+    if not valid:
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def load_or_import(filename: str, cache=None, directory: str = DEFAULT_SNAPSHOT_DIR):
+    '''
+    Returns categorized transactions of the file: from its snapshot if the
+    file did not change, otherwise through import_financial_data and
+    categorize_all_transactions, writing a new snapshot.
+    '''
+    snapshot = load_snapshot(filename, directory)
+    if snapshot is not None:
+        return snapshot
+
+    fingerprint = file_fingerprint(filename)
+    transactions = cat.categorize_all_transactions(
+        fdi.import_financial_data(filename), cache)
+    write_snapshot(filename, transactions, fingerprint, directory)
+    return transactions
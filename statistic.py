@@ -1,5 +1,70 @@
 import ru_local as ru
+import calendar
+import sys
 from datetime import datetime
+from functools import lru_cache
+
+
+class StatisticsMixin:
+    '''
+    Methods of a transactions store (TransactionColumns, TransactionDatabase,
+    Ledger, TransactionList) that the functions of this module and of
+    planing.py call instead of reading the transactions one by one.
+
+    They run the functions calculate_basic_stats, calculate_by_category,
+    analyze_by_time and expenses_by_month of the module that defines
+    the store, so the store module does not repeat the methods.
+    '''
+    __slots__ = ()
+
+    def _backend(self):
+        return sys.modules[type(self).__module__]
+
+    def basic_stats(self) -> dict:
+        '''
+        Same result as calculate_basic_stats.
+        '''
+        return self._backend().calculate_basic_stats(self)
+
+    def by_category(self) -> dict:
+        '''
+        Same result as calculate_by_category.
+        '''
+        return self._backend().calculate_by_category(self)
+
+    def by_time(self) -> dict:
+        '''
+        Same result as analyze_by_time.
+        '''
+        return self._backend().analyze_by_time(self)
+
+    def months_data(self) -> dict:
+        '''
+        Expenses of type "расход" by month and category,
+        the input of planing.summarize_months_data.
+        '''
+        return self._backend().expenses_by_month(self)
+
+
+@lru_cache(maxsize=4096)
+def period_key(date: str) -> tuple:
+    '''
+    Returns the period (year, month) of a date 'YYYY-MM-DD'.
+    ISO dates are sliced directly, anything else (and any impossible day
+    such as '2024-02-31') goes through strptime, which rejects it.
+    Results are memoized: a statement has few distinct dates,
+    so most rows are answered from the cache.
+    :param date:
+    :return (year, month):
+    '''
+    if (len(date) == 10 and date[4] == '-' and date[7] == '-'
+            and date[:4].isdigit() and date[5:7].isdigit() and date[8:].isdigit()):
+        year, month, day = int(date[:4]), int(date[5:7]), int(date[8:])
+        if 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]:
+            return year, month
+
+    parsed = datetime.strptime(date, '%Y-%m-%d')
+    return parsed.year, parsed.month
 
 
 def calculate_basic_stats(transactions_list: list) -> dict:
@@ -7,22 +72,27 @@ def calculate_basic_stats(transactions_list: list) -> dict:
     This function calculates the total income and expenses,
     the remaining balance and the number of transactions.
     Then generates a dictionary from the received data.
+    Transactions may be any iterable, they are read once.
+    A store with its own basic_stats() method (TransactionColumns,
+    TransactionDatabase, Ledger, TransactionList) computes the result itself.
     :param transactions_list:
     :return info:
     '''
+    if hasattr(transactions_list, 'basic_stats'):
+        return transactions_list.basic_stats()
 
     total_income = 0
     total_expenses = 0
+    transactions_quantity = 0
     for transactions in transactions_list:
         if transactions[3] == ru.INCOME:
             total_income += transactions[1]
         else:
             total_expenses += transactions[1]
+        transactions_quantity += 1
 
     balance = total_income - total_expenses
 
-    transactions_quantity = len(transactions_list)
-
     info = {ru.INCOME: total_income,
             ru.EXPENSE: total_expenses,
             ru.BALANCE: balance,
@@ -55,40 +125,50 @@ def calculate_by_category(transactions_list) -> dict:
     '''
     This function creates a dictionary with information
     for each category (key - category, value - information)
+    Transactions may be any iterable, they are read once.
+    A store with its own by_category() method (TransactionColumns,
+    TransactionDatabase, Ledger, TransactionList) computes the result itself.
     :param transactions_list:
     :return category_info:
     '''
+    if hasattr(transactions_list, 'by_category'):
+        return transactions_list.by_category()
 
     category_info = {}
-    total_expenses = calculate_basic_stats(transactions_list)[ru.EXPENSE]
-    trans_by_category = sort_by_category(transactions_list)
+    total_expenses = 0
 
-    for category in trans_by_category:
-        category_list = trans_by_category[category]
+    # Expense sum and number of transactions for each category.
+    for transactions in transactions_list:
+        if transactions[3] == ru.INCOME:
+            continue
+        total_expenses += transactions[1]
 
-        total_sum = 0
-        for transactions in category_list:
-            total_sum += transactions[1]
-            transactions_quantity = len(category_list)
+        category = transactions[4]
+        if category in category_info:
+            category_info[category][0] += transactions[1]
+            category_info[category][1] += 1
+        else:
+            category_info[category] = [transactions[1], 1]
 
+    for category in category_info:
+        total_sum = category_info[category][0]
         percent = round(total_sum / total_expenses * 100, 2)
-
-        info = [total_sum, transactions_quantity, percent]
-        category_info[category] = info
+        category_info[category].append(percent)
 
     return category_info
 
 
 def sort_by_month(transactions_list) -> dict:
     '''
-    This function groups transactions into by month
+    This function groups transactions into by month.
+    Keys are periods (year, month), so different years are not merged.
     :param transactions_list:
     :return trans_by_month:
     '''
     trans_by_month = {}
 
     for transactions in transactions_list:
-        month_trans = datetime.strptime(transactions[0], '%Y-%m-%d').month
+        month_trans = period_key(transactions[0])
 
         if month_trans in trans_by_month:
             trans_by_month[month_trans].append(transactions)
@@ -101,41 +181,46 @@ def sort_by_month(transactions_list) -> dict:
 def analyze_by_time(transactions_list) -> dict:
     '''
     This function creates a dictionary with information
-    for each month (key - month, value - information)
+    for each month (key - (year, month), value - information)
+    Transactions may be any iterable, they are read once.
+    A store with its own by_time() method (TransactionColumns,
+    TransactionDatabase, Ledger, TransactionList) computes the result itself.
     :param transactions_list:
     :return month_info:
     '''
-    month_info = {}
-    trans_by_month = sort_by_month(transactions_list)
+    if hasattr(transactions_list, 'by_time'):
+        return transactions_list.by_time()
 
-    for month in trans_by_month:
-        month_list = trans_by_month[month]
+    month_info = {}
+    # Number of transactions of each category for each month:
+    # {(year, month) : {category : quantity, ...}, ...}
+    month_categories = {}
 
-        income = calculate_basic_stats(month_list)[ru.INCOME]
-        expenses = calculate_basic_stats(month_list)[ru.EXPENSE]
+    for transactions in transactions_list:
+        month = period_key(transactions[0])
 
-        quantity_category = []
-        category_list = []
+        if month not in month_info:
+            month_info[month] = {ru.INCOME: 0, ru.EXPENSE: 0}
+            month_categories[month] = {}
 
-        for transactions in month_list:
-            category = transactions[4]
-            if category in category_list:
-                quantity_category[category_list.index(category)] += 1
-            else:
-                quantity_category.append(1)
-                category_list.append(category)
+        if transactions[3] == ru.INCOME:
+            month_info[month][ru.INCOME] += transactions[1]
+        else:
+            month_info[month][ru.EXPENSE] += transactions[1]
 
-        n = max(quantity_category)
-        popular_categories = []
-        for index_category in range(len(category_list)):
-            if quantity_category[index_category] == n:
-                popular_categories.append(category_list[index_category])
+        quantity_category = month_categories[month]
+        category = transactions[4]
+        quantity_category[category] = quantity_category.get(category, 0) + 1
 
-        info = {ru.INCOME: income,
-                ru.EXPENSE: expenses,
-                ru.POPULAR_CATEGORIES: popular_categories}
+    for month in month_info:
+        quantity_category = month_categories[month]
 
-        month_info[month] = info
+        n = max(quantity_category.values())
+        popular_categories = []
+        for category in quantity_category:
+            if quantity_category[category] == n:
+                popular_categories.append(category)
 
+        month_info[month][ru.POPULAR_CATEGORIES] = popular_categories
 
     return month_info
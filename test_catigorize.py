@@ -0,0 +1,83 @@
+import csv
+import os
+import random
+
+import catigorize as cat
+
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.csv')
+
+
+def naive_category(description: str, categories: dict) -> str:
+    # categorize_transaction with a dictionary: the plain nested loop.
+    return cat.categorize_transaction(description, categories)
+
+
+def vocabulary_descriptions(categories: dict) -> list:
+    '''
+    Descriptions made of the keywords: every keyword alone, in a phrase,
+    upper-cased and cut, and pairs of keywords of different categories
+    in both orders, so the "first category wins" rule is checked.
+    '''
+    keywords = [keyword for words in categories.values() for keyword in words]
+    descriptions = []
+    for keyword in keywords:
+        descriptions += [keyword, f'Оплата: {keyword}!', keyword.upper(),
+                         keyword[1:], keyword[:-1]]
+
+    generator = random.Random(0)
+    for _ in range(2000):
+        first, second = generator.sample(keywords, 2)
+        descriptions += [f'{first} {second}', f'{second}{first}']
+    # Random strings of keyword pieces find overlapping and partial matches.
+    for _ in range(2000):
+        pieces = [generator.choice(keywords)[generator.randrange(3):][:generator.randrange(1, 6)]
+                  for _ in range(generator.randrange(1, 5))]
+        descriptions.append(''.join(pieces))
+    return descriptions
+
+
+def data_descriptions() -> list:
+    with open(DATA_FILE, encoding='utf-8-sig', newline='') as file:
+        return [row['description'] for row in csv.DictReader(file)]
+
+
+def test_matcher_matches_naive_search_on_vocabulary():
+    categories = cat.create_categories()
+    matcher = cat.KeywordMatcher(categories)
+    for description in vocabulary_descriptions(categories):
+        assert matcher.match(description) == naive_category(description, categories), description
+
+
+def test_matcher_matches_naive_search_on_data():
+    categories = cat.create_categories()
+    matcher = cat.get_default_matcher()
+    descriptions = data_descriptions()
+    assert descriptions
+    for description in descriptions:
+        assert (cat.categorize_transaction(description, matcher)
+                == naive_category(description, categories)), description
+
+
+def test_matcher_matches_naive_search_on_random_keywords():
+    # A small alphabet makes keywords that are suffixes and infixes of
+    # each other, where the failure links of the automaton decide.
+    generator = random.Random(1)
+
+    def word(longest: int) -> str:
+        return ''.join(generator.choice('абв') for _ in range(generator.randint(1, longest)))
+
+    for _ in range(300):
+        categories = {f'category {i}': [word(4) for _ in range(generator.randint(1, 3))]
+                      for i in range(generator.randint(1, 5))}
+        matcher = cat.KeywordMatcher(categories)
+        for _ in range(30):
+            description = word(12)
+            assert (matcher.match(description)
+                    == naive_category(description, categories)), (categories, description)
+
+
+def test_matcher_without_keywords_gives_other():
+    matcher = cat.KeywordMatcher(cat.create_categories())
+    assert matcher.match('') == 'другое'
+    assert matcher.match('Стрижка в барбершопе') == 'другое'